@@ -1,14 +1,26 @@
-from typing import Optional
+import asyncio
+import hashlib
+from dataclasses import dataclass
+from typing import Any, Callable, Optional
 
-from openai import AsyncOpenAI
-from orjson import orjson
-from pydantic_ai import Agent, UnexpectedModelBehavior, format_as_xml, ModelSettings
-from pydantic_ai.models.openai import OpenAIChatModel
-from pydantic_ai.providers import Provider
-from pydantic_ai.providers.openai import OpenAIProvider
+import orjson
+from pydantic import TypeAdapter
+from pydantic_ai import Agent, ModelSettings, UnexpectedModelBehavior, format_as_xml
 
-from data_processing.settings import LANGUAGES_DST, conf
-from data_processing.utils import AnalyzeResponse, GenerateResponse
+from data_processing.ai_store import get_ai_store, get_verdict_store
+from data_processing.llm_cache import LLMCache, get_llm_cache
+from data_processing.model_pool import BalancedModel, get_endpoints
+from data_processing.precheck import precheck
+from data_processing.prompt_budget import fit_definitions
+from data_processing.settings import conf
+from data_processing.utils import (
+    AnalyzeResponse,
+    GenerateResponse,
+    WordAnalyzeResponse,
+    WordGenerateResponse,
+    retry,
+)
+from data_processing.words import normalize_word
 
 GENERATE_PROMPT = """
 You are a translator and interpreter. Your job is to provide useful analysis and explanations in English for words in another language to help students learn the meaning and use of the words.
@@ -38,68 +50,359 @@ We want to identify words which have a significantly invalid translation, exampl
 You will be provided dictionary definitions when available, you should strongly consider them when evaluating the answer.
 """
 
+BATCH_PROMPT = """
+Several words are given at once. Answer each of them separately and independently of the others, in the order given, and copy each word exactly as given into the "word" field of its answer.
+When a lemma is given, the words are forms of that word and the dictionary definitions given next to the lemma apply to all of them. Explain each form as it is given, not only the lemma.
+"""
 
-def _make_analysis_prompt(language_id: str, word):
-    language = conf.LANGUAGES[language_id]
+AGENT_INSTRUCTIONS = {
+    "generate": GENERATE_PROMPT,
+    "analyze": ANALYZE_PROMPT,
+    "generate_batch": GENERATE_PROMPT + BATCH_PROMPT,
+    "analyze_batch": ANALYZE_PROMPT + BATCH_PROMPT,
+}
+
+
+@dataclass
+class AnalysisStats:
+    analyzed: int = 0
+    skipped: int = 0
+
+    def summary(self) -> str:
+        return f"Analyzed {self.analyzed:,} words, reused the stored verdict for {self.skipped:,} unchanged words."
+
+
+analysis_stats = AnalysisStats()
+
+
+@dataclass
+class BatchStats:
+    batches: int = 0
+    words: int = 0
+    split: int = 0
+
+    def summary(self) -> str:
+        return (
+            f"Sent {self.words:,} words in {self.batches:,} batched requests, "
+            f"{self.split:,} batches had missing or invalid answers and were split."
+        )
 
-    ai_path = LANGUAGES_DST / f"{language_id}/ai/"
-    ai_path.mkdir(parents=True, exist_ok=True)
 
-    result_file = ai_path / f"{word}.json"
-    result = GenerateResponse(**orjson.loads(result_file.read_text()))
+batch_stats = BatchStats()
 
-    prompt = {
+
+def _analysis_request(language_id: str, word: str, definitions: dict) -> dict:
+    language = conf.LANGUAGES[language_id]
+    result = get_word_data(language_id, word)
+
+    return {
         f"word_in_{language.lower()}": word,
         "translations_in_english": result.translation,
         f"example_sentences_in_{language.lower()}": result.sentences,
         "context": result.context,
+        "dictionary_definitions": fit_definitions(definitions),
     }
 
-    return format_as_xml(prompt, root_tag="user")
 
+def _make_analysis_prompt(language_id: str, word, definitions: dict):
+    return format_as_xml(_analysis_request(language_id, word, definitions), root_tag="user")
 
-def _get_ai_model(model: Optional[str] = None) -> OpenAIChatModel:
+
+def _get_ai_model(model: Optional[str] = None) -> BalancedModel:
     if model is None:
         model = conf.OPENAI_GENERATE_MODEL
-    provider: Provider[AsyncOpenAI] = OpenAIProvider(
-        api_key=conf.OPENAI_API_KEY,
-        base_url=conf.OPENAI_PROVIDER,
-    )
-    return OpenAIChatModel(model, provider=provider, settings=ModelSettings(parallel_tool_calls=False))
+    return BalancedModel(model, get_endpoints(), settings=ModelSettings(parallel_tool_calls=False))
 
 
-def is_word_defined(language_id: str, word: str) -> bool:
-    ai_path = LANGUAGES_DST / f"{language_id}/ai/"
-    result_file = ai_path / f"{word}.json"
-    return result_file.exists()
+def _cache_key(agent: Agent, prompt: str) -> str:
+    return LLMCache.key(agent.model.model_name, AGENT_INSTRUCTIONS[agent.name], prompt)
+
+
+def _is_cacheable(output) -> bool:
+    """
+    Answers for words the model didn't understand aren't reused, so `ai_generate --retry-failed` asks again
+    """
+    answers = output if isinstance(output, list) else [output]
+    return all(getattr(answer, "understood", True) for answer in answers)
+
+
+def _cached_output(agent: Agent, key: str):
+    cached = get_llm_cache().get(key)
+    if cached is not None:
+        output = TypeAdapter(agent.output_type).validate_json(cached)
+        if _is_cacheable(output):
+            return output
+    return None
 
 
-def has_good_analysis(language_id: str, word: str, definitions: dict, agent: Agent) -> bool:
+def _cache_output(agent: Agent, key: str, output):
+    if _is_cacheable(output):
+        get_llm_cache().put(key, TypeAdapter(agent.output_type).dump_json(output).decode("utf-8"))
+
+
+@retry(retries=conf.LLM_RETRIES, deadline=conf.LLM_RETRY_DEADLINE)
+def run_agent(agent: Agent, prompt: str):
+    """
+    Run the agent, reusing the previous output if the same model already answered the same prompt and understood
+    the words. Throttling, server and connection errors are retried, bad model output is left to the caller.
+    """
+    key = _cache_key(agent, prompt)
+    output = _cached_output(agent, key)
+    if output is None:
+        output = agent.run_sync(prompt).output
+        _cache_output(agent, key, output)
+    return output
+
+
+@retry(retries=conf.LLM_RETRIES, deadline=conf.LLM_RETRY_DEADLINE)
+async def run_agent_async(agent: Agent, prompt: str):
+    key = _cache_key(agent, prompt)
+    output = _cached_output(agent, key)
+    if output is None:
+        output = (await agent.run(prompt)).output
+        _cache_output(agent, key, output)
+    return output
+
+
+def run_agent_until_valid(agent: Agent, prompt: str, word: str):
+    """
+    Run the agent, asking again for as long as the model gives bad output
+    """
     while True:
         try:
-            if not is_word_defined(language_id, word):
-                return False
+            return run_agent(agent, prompt)
+        except UnexpectedModelBehavior:
+            print(f"{word} error, retrying...")
 
-            prompt = _make_analysis_prompt(language_id, word)
-            result = agent.run_sync(prompt)
-            output: AnalyzeResponse = result.output
 
-            return output.valid
+async def run_agent_until_valid_async(agent: Agent, prompt: str, word: str):
+    while True:
+        try:
+            return await run_agent_async(agent, prompt)
         except UnexpectedModelBehavior:
-            print("Error, retrying...")
+            print(f"{word} error, retrying...")
+
+
+def get_batch_size(agent: Agent) -> int:
+    return max(conf.LLM_BATCH_SIZE.get(agent.model.model_name, conf.LLM_BATCH_SIZE_DEFAULT), 1)
+
+
+def _refer_repeated_definitions(requests: dict[str, dict]) -> list[dict]:
+    """
+    The requests with each definition already given for an earlier word replaced by a reference to that word.
+    Definitions with the same text are usually the same object, so finding them costs next to nothing.
+    """
+    seen: dict[str, tuple[str, str]] = {}
+    result = []
+    for word, request in requests.items():
+        definitions = request.get("dictionary_definitions")
+        if definitions:
+            referred = {}
+            for dictionary, text in definitions.items():
+                first_dictionary, first_word = seen.setdefault(text, (dictionary, word))
+                reference = f"Same as the {first_dictionary} definition of {first_word}."
+                referred[dictionary] = reference if first_word != word and len(reference) < len(text) else text
+            request = {**request, "dictionary_definitions": referred}
+        result.append(request)
+    return result
+
+
+def make_batch_prompt(requests: dict[str, dict]) -> str:
+    return format_as_xml(_refer_repeated_definitions(requests), root_tag="user", item_tag="word")
+
+
+def _match_answers(agent: Agent, requests: dict[str, dict], answers: list) -> dict[str, Any]:
+    """
+    The answers of a batch by word, as the output type of the single word agent. Answers for words that weren't
+    asked, and repeated answers, are dropped.
+    """
+    outputs = {}
+    for answer in answers:
+        word = normalize_word(answer.word)
+        if word in requests and word not in outputs:
+            outputs[word] = agent.output_type.model_validate(answer.model_dump(exclude={"word"}))
+    return outputs
+
+
+def _split_missing(requests: dict[str, dict], outputs: dict[str, Any]) -> list[dict[str, dict]]:
+    batch_stats.batches += 1
+    batch_stats.words += len(requests)
+    missing = [word for word in requests if word not in outputs]
+    if not missing:
+        return []
+
+    batch_stats.split += 1
+    half = (len(missing) + 1) // 2
+    return [
+        {word: requests[word] for word in part}
+        for part in (missing[:half], missing[half:])
+        if part
+    ]
+
+
+def _single_request(requests: dict[str, dict]) -> tuple[str, str]:
+    [(word, request)] = requests.items()
+    return word, format_as_xml(request, root_tag="user")
+
+
+def run_agent_batch(batch_agent: Agent, agent: Agent, requests: dict[str, dict],
+                    make_prompt: Callable[[dict[str, dict]], str] = make_batch_prompt) -> dict[str, Any]:
+    """
+    Answer the requests, keyed by word, with one model request for all of them. Words missing from the answer, or
+    all of them if the answer was invalid, are asked again in two smaller batches, and a single word with `agent`.
+    """
+    if len(requests) == 1:
+        word, prompt = _single_request(requests)
+        return {word: run_agent_until_valid(agent, prompt, word)}
+
+    try:
+        answers = run_agent(batch_agent, make_prompt(requests))
+    except UnexpectedModelBehavior:
+        answers = []
+
+    outputs = _match_answers(agent, requests, answers)
+    for part in _split_missing(requests, outputs):
+        outputs.update(run_agent_batch(batch_agent, agent, part, make_prompt))
+    return outputs
+
+
+async def run_agent_batch_async(batch_agent: Agent, agent: Agent, requests: dict[str, dict],
+                                make_prompt: Callable[[dict[str, dict]], str] = make_batch_prompt) -> dict[str, Any]:
+    if len(requests) == 1:
+        word, prompt = _single_request(requests)
+        return {word: await run_agent_until_valid_async(agent, prompt, word)}
+
+    try:
+        answers = await run_agent_async(batch_agent, make_prompt(requests))
+    except UnexpectedModelBehavior:
+        answers = []
+
+    outputs = _match_answers(agent, requests, answers)
+    parts = _split_missing(requests, outputs)
+    for part_outputs in await asyncio.gather(
+        *(run_agent_batch_async(batch_agent, agent, part, make_prompt) for part in parts)
+    ):
+        outputs.update(part_outputs)
+    return outputs
+
+
+def is_word_defined(language_id: str, word: str) -> bool:
+    return word in get_ai_store(language_id)
+
+
+def _analysis_digest(language_id: str, word: str, definitions: dict) -> str:
+    """
+    Hash of everything the analysis verdict depends on
+    """
+    data = {
+        "result": get_word_data(language_id, word).model_dump(),
+        "definitions": definitions,
+    }
+    return hashlib.sha256(orjson.dumps(data, option=orjson.OPT_SORT_KEYS)).hexdigest()
+
+
+def _stored_verdict(language_id: str, word: str, digest: str, recheck: bool) -> Optional[bool]:
+    if recheck:
+        return None
+
+    valid = get_verdict_store(language_id).get(word, digest)
+    if valid is not None:
+        analysis_stats.skipped += 1
+    return valid
+
+
+def _store_verdict(language_id: str, word: str, digest: str, valid: bool):
+    get_verdict_store(language_id).put(word, digest, valid)
+    analysis_stats.analyzed += 1
+
+
+def _known_verdict(language_id: str, word: str, definitions: dict, recheck: bool) -> tuple[str, Optional[bool]]:
+    """
+    The digest of the analysis, and its verdict if it's known without asking the model
+    """
+    if not is_word_defined(language_id, word):
+        return "", False
+
+    digest = _analysis_digest(language_id, word, definitions)
+    valid = _stored_verdict(language_id, word, digest, recheck)
+    if valid is None:
+        valid = precheck(language_id, word, get_word_data(language_id, word))
+    return digest, valid
+
+
+def has_good_analysis(language_id: str, word: str, definitions: dict, agent: Agent, recheck: bool = False) -> bool:
+    digest, valid = _known_verdict(language_id, word, definitions, recheck)
+    if valid is not None:
+        return valid
+
+    prompt = _make_analysis_prompt(language_id, word, definitions)
+    output: AnalyzeResponse = run_agent_until_valid(agent, prompt, word)
+    _store_verdict(language_id, word, digest, output.valid)
+    return output.valid
+
+
+async def has_good_analysis_async(language_id: str, word: str, definitions: dict, agent: Agent,
+                                  recheck: bool = False) -> bool:
+    digest, valid = _known_verdict(language_id, word, definitions, recheck)
+    if valid is not None:
+        return valid
+
+    prompt = _make_analysis_prompt(language_id, word, definitions)
+    output: AnalyzeResponse = await run_agent_until_valid_async(agent, prompt, word)
+    _store_verdict(language_id, word, digest, output.valid)
+    return output.valid
+
+
+def analyze_batch(language_id: str, definitions: dict[str, dict], batch_agent: Agent, agent: Agent,
+                  recheck: bool = False) -> dict[str, bool]:
+    """
+    has_good_analysis for several words, the words without a stored verdict are analyzed in batches
+    """
+    verdicts = {}
+    digests = {}
+    requests = {}
+    for word, word_definitions in definitions.items():
+        digest, valid = _known_verdict(language_id, word, word_definitions, recheck)
+        if valid is not None:
+            verdicts[word] = valid
+            continue
+
+        digests[word] = digest
+        requests[word] = _analysis_request(language_id, word, word_definitions)
+
+    if requests:
+        for word, output in run_agent_batch(batch_agent, agent, requests).items():
+            _store_verdict(language_id, word, digests[word], output.valid)
+            verdicts[word] = output.valid
+    return verdicts
 
 
-def get_ai_generate_agent() -> Agent:
+def get_ai_generate_agent(batched: bool = False) -> Agent:
+    """
+    The batched agent answers several words per request with a list of answers keyed by word, see run_agent_batch
+    """
     model = _get_ai_model()
-    return Agent(model, instructions=GENERATE_PROMPT, output_type=GenerateResponse)
+    if batched:
+        return Agent(
+            model,
+            name="generate_batch",
+            instructions=AGENT_INSTRUCTIONS["generate_batch"],
+            output_type=list[WordGenerateResponse],
+        )
+    return Agent(model, name="generate", instructions=AGENT_INSTRUCTIONS["generate"], output_type=GenerateResponse)
 
 
-def get_ai_analyze_agent() -> Agent:
+def get_ai_analyze_agent(batched: bool = False) -> Agent:
     model = _get_ai_model(conf.OPENAI_ANALYZE_MODEL)
-    return Agent(model, instructions=ANALYZE_PROMPT, output_type=AnalyzeResponse)
+    if batched:
+        return Agent(
+            model,
+            name="analyze_batch",
+            instructions=AGENT_INSTRUCTIONS["analyze_batch"],
+            output_type=list[WordAnalyzeResponse],
+        )
+    return Agent(model, name="analyze", instructions=AGENT_INSTRUCTIONS["analyze"], output_type=AnalyzeResponse)
 
 
-def get_word_data(language_id: str, word: str) -> GenerateResponse:
-    ai_path = LANGUAGES_DST / f"{language_id}/ai/"
-    result_file = ai_path / f"{word}.json"
-    return GenerateResponse(**orjson.loads(result_file.read_text(encoding="utf-8")))
+def get_word_data(language_id: str, word: str) -> Optional[GenerateResponse]:
+    return get_ai_store(language_id).get(word)
@@ -1,17 +1,46 @@
+import sys
+from itertools import islice
 from time import perf_counter
 
 from rich import print
 
-from data_processing.ai import get_ai_analyze_agent, has_good_analysis
-from data_processing.dictionary import get_word_definitions
+from data_processing.ai import (
+    analysis_stats,
+    analyze_batch,
+    batch_stats,
+    get_ai_analyze_agent,
+    get_batch_size,
+)
+from data_processing.ai_store import get_ai_store
+from data_processing.dictionary import DictionaryUnavailable, get_word_definitions
+from data_processing.jobs import NEEDS_REGENERATION, get_job_ledger
+from data_processing.llm_cache import get_llm_cache
+from data_processing.precheck import precheck_stats
+from data_processing.prompt_budget import budget_stats
 from data_processing.settings import conf
-from data_processing.utils import list_words
+from data_processing.utils import retry_stats
+from data_processing.words import get_word_source
 
 
 def main():
+    """
+    Check every generated result with the analyze model, bad results are queued for regeneration.
+    --batch-size sends that many words per model request, the default is set per model with LLM_BATCH_SIZE.
+    """
     agent = get_ai_analyze_agent()
+    batch_agent = get_ai_analyze_agent(batched=True)
+    recheck_all = "--recheck-all" in sys.argv
+    if "--no-cache" in sys.argv:
+        get_llm_cache().size = 0
+
+    batch_size = get_batch_size(agent)
+    if "--batch-size" in sys.argv:
+        batch_size_idx = sys.argv.index("--batch-size") + 1
+        batch_size = max(int(sys.argv[batch_size_idx]), 1)
+
     total_start = perf_counter()
     processed_words = 0
+    unavailable = 0
 
     try:
         for language_id in conf.LANGUAGES:
@@ -19,19 +48,33 @@ def main():
             print(f" ----- {language} -----")
             print("")
 
-            for word in list_words(language_id):
+            # Bad results are queued for the next ai_generate run
+            ledger = get_job_ledger(language_id)
+            store = get_ai_store(language_id)
+            ledger.sync(get_word_source(language_id), store.__contains__)
+
+            words = iter(get_word_source(language_id))
+            while batch := list(islice(words, batch_size)):
                 start = perf_counter()
-                print(f"{word} ", end="")
-                definitions = get_word_definitions(word, language_id)
-                valid = has_good_analysis(language_id, word, definitions, agent)
-                elapsed = perf_counter() - start
+                definitions = {}
+                for word in batch:
+                    try:
+                        definitions[word] = get_word_definitions(word, language_id)
+                    except DictionaryUnavailable as e:
+                        print(f"{word} skipped, {e}")
+                        unavailable += 1
+                verdicts = analyze_batch(language_id, definitions, batch_agent, agent, recheck_all)
+                elapsed = (perf_counter() - start) / max(len(verdicts), 1)
 
-                if valid:
-                    print(f"is valid ({elapsed:.3f}s)")
-                else:
-                    print(f"is BAD! 😢 ({elapsed:.3f}s)")
+                for word, valid in verdicts.items():
+                    if valid:
+                        print(f"{word} is valid ({elapsed:.3f}s)")
+                    else:
+                        print(f"{word} is BAD! 😢 ({elapsed:.3f}s)")
+                        if word in store:
+                            ledger.set_state(word, NEEDS_REGENERATION)
 
-                processed_words += 1
+                    processed_words += 1
 
             print("")
     except KeyboardInterrupt:
@@ -39,8 +82,18 @@ def main():
         pass
 
     total_elapsed = perf_counter() - total_start
-    per_word = total_elapsed / processed_words
+    per_word = total_elapsed / max(processed_words, 1)
 
     print(
         f"Processed {processed_words:,} words in {total_elapsed:.3f}s, took on average {per_word:.3f}s per word."
     )
+    print(analysis_stats.summary())
+    print(precheck_stats.summary())
+    if batch_stats.batches:
+        print(batch_stats.summary())
+    print(get_llm_cache().summary())
+    if budget_stats.prompts:
+        print(budget_stats.summary())
+    print(retry_stats.summary())
+    if unavailable:
+        print(f"Skipped {unavailable:,} words because a dictionary was unavailable.")
@@ -0,0 +1,29 @@
+import sys
+
+from rich import print
+
+from data_processing.ai_store import get_ai_store
+from data_processing.settings import conf
+
+
+def main():
+    """
+    Sync the per-word AI result files for the frontend with the per-language result logs
+
+    Per-word files changed since the last sync, e.g. by a git pull, are imported into the log first.
+    """
+    languages = conf.LANGUAGES
+    compact = "--compact" in sys.argv
+
+    if "--language" in sys.argv:
+        language_idx = sys.argv.index("--language") + 1
+        languages = [sys.argv[language_idx]]
+
+    for language_id in languages:
+        store = get_ai_store(language_id)
+        if compact:
+            store.log.compact()
+        imported, written = store.sync_word_files()
+        if imported:
+            print(f"Imported {imported:,} changed {conf.LANGUAGES[language_id]} AI results from {store.word_files}")
+        print(f"Exported {written:,} changed {conf.LANGUAGES[language_id]} AI results to {store.word_files}")
@@ -1,18 +1,75 @@
+import asyncio
 import sys
+from dataclasses import dataclass, field
+from itertools import islice
 from time import perf_counter
+from typing import Callable, Iterable, Iterator, Optional
 
-from pydantic_ai import UnexpectedModelBehavior, format_as_xml
+from pydantic_ai import Agent, UnexpectedModelBehavior, format_as_xml
 from rich import print
 from tqdm import tqdm
 
 from data_processing.ai import (
+    analysis_stats,
+    batch_stats,
     get_ai_analyze_agent,
     get_ai_generate_agent,
-    has_good_analysis, get_word_data,
+    get_batch_size,
+    get_word_data,
+    has_good_analysis,
+    has_good_analysis_async,
+    is_word_defined,
+    make_batch_prompt,
+    run_agent,
+    run_agent_async,
+    run_agent_batch,
+    run_agent_batch_async,
 )
-from data_processing.dictionary import get_word_definitions
-from data_processing.settings import LANGUAGES_DST, conf
-from data_processing.utils import GenerateResponse, list_words
+from data_processing.ai_store import get_ai_store
+from data_processing.dictionary import (
+    LEMMA_FINDERS_VERSION,
+    DictionaryUnavailable,
+    find_cached_lemmas,
+    find_lemma,
+    get_word_definitions,
+    shared_article,
+)
+from data_processing.jobs import (
+    ALL_STATES,
+    FAILED,
+    GENERATED,
+    NEEDS_REGENERATION,
+    PENDING,
+    TODO_STATES,
+    get_job_ledger,
+)
+from data_processing.llm_cache import get_llm_cache
+from data_processing.model_pool import endpoint_summary
+from data_processing.precheck import precheck_stats
+from data_processing.prompt_budget import budget_stats, fit_definitions
+from data_processing.settings import conf
+from data_processing.utils import GenerateResponse, retry_stats
+from data_processing.words import get_word_source, normalize_word
+
+
+@dataclass
+class RunOptions:
+    verbose: bool = False
+    check: bool = False
+    regenerate: bool = False
+    recheck_all: bool = False
+    group_lemmas: bool = False
+
+
+@dataclass
+class RunStats:
+    total_words: int = 0
+    processed_words: int = 0
+    reprocessed: int = 0
+    unavailable: int = 0
+    groups: int = 0
+    grouped_words: int = 0
+    written: dict[str, list[str]] = field(default_factory=dict)
 
 
 def print_output(elapsed: float, output: GenerateResponse):
@@ -29,53 +86,397 @@ def print_output(elapsed: float, output: GenerateResponse):
         print("")
 
 
-def is_word_defined(language_id: str, word: str) -> bool:
-    ai_path = LANGUAGES_DST / f"{language_id}/ai/"
-    result_file = ai_path / f"{word}.json"
-    return result_file.exists()
+def write_result(language_id: str, word, output: GenerateResponse, elapsed: float, stats: RunStats):
+    ledger = get_job_ledger(language_id)
+    if output.understood:
+        get_ai_store(language_id).put(word, output)
+        stats.written.setdefault(language_id, []).append(word)
+        ledger.finish(word, GENERATED, elapsed)
+    else:
+        # A regenerated word keeps its previous result
+        state = GENERATED if is_word_defined(language_id, word) else FAILED
+        ledger.finish(word, state, elapsed, "Not understood")
+
+
+def make_request(language_id: str, word: str, definitions: dict) -> dict:
+    language = conf.LANGUAGES[language_id]
+    word_prop = "word_in_" + language.lower()
+    return {
+        "source_language": language,
+        "source_language_id": language_id,
+        word_prop: word,
+        "dictionary_definitions": fit_definitions(definitions),
+    }
+
+
+@dataclass
+class WordRequest:
+    word: str
+    request: dict
+    reprocessing: bool = False
+
+
+def _skip_unavailable(language_id: str, word: str, error: DictionaryUnavailable, options: RunOptions,
+                      stats: RunStats):
+    # Try again on a later run rather than generating without the definitions
+    if options.verbose:
+        print(f"{word} ... skipped, {error}")
+    get_job_ledger(language_id).finish(word, PENDING, error=str(error))
+    stats.unavailable += 1
+
+
+def _word_request(language_id: str, word: str, state: str, definitions: dict,
+                  options: RunOptions) -> Optional[WordRequest]:
+    """
+    The model request for the word, or None if the word doesn't need generating. A request marked as reprocessing
+    is only sent if the existing result fails the analysis.
+    """
+    request = make_request(language_id, word, definitions)
+    if not is_word_defined(language_id, word):
+        return WordRequest(word, request)
+
+    if options.regenerate or state == NEEDS_REGENERATION:
+        request["previous_analysis"] = get_word_data(language_id, word).model_dump()
+        return WordRequest(word, request)
+    elif not options.check:
+        if options.verbose:
+            print(f"{word} ... exists")
+        get_job_ledger(language_id).finish(word, GENERATED)
+        return None
+
+    request["previous_analysis"] = get_word_data(language_id, word).model_dump()
+    return WordRequest(word, request, reprocessing=True)
+
+
+def _checked(language_id: str, prepared: WordRequest, good: bool, options: RunOptions) -> Optional[WordRequest]:
+    ledger = get_job_ledger(language_id)
+    if good:
+        if options.verbose:
+            print(f"{prepared.word} ... good enough")
+        ledger.finish(prepared.word, GENERATED)
+        return None
+
+    ledger.set_state(prepared.word, NEEDS_REGENERATION)
+    return prepared
+
+
+def prepare_sync(analysis_agent: Agent, language_id: str, word: str, state: str, options: RunOptions,
+                 stats: RunStats) -> Optional[WordRequest]:
+    """
+    Build the model request for the word, or None if the word doesn't need generating
+    """
+    try:
+        definitions = get_word_definitions(word, language_id)
+    except DictionaryUnavailable as e:
+        _skip_unavailable(language_id, word, e, options, stats)
+        return None
 
+    prepared = _word_request(language_id, word, state, definitions, options)
+    if prepared is None or not prepared.reprocessing:
+        return prepared
+    good = has_good_analysis(language_id, word, definitions, analysis_agent, options.recheck_all)
+    return _checked(language_id, prepared, good, options)
 
-def write_result(language_id: str, word, output: GenerateResponse):
-    ai_path = LANGUAGES_DST / f"{language_id}/ai/"
-    ai_path.mkdir(parents=True, exist_ok=True)
 
-    result_file = ai_path / f"{word}.json"
-    with open(result_file, "tw") as f:
-        f.write(output.model_dump_json(indent=2))
+async def prepare_async(analysis_agent: Agent, language_id: str, word: str, state: str, options: RunOptions,
+                        stats: RunStats) -> Optional[WordRequest]:
+    try:
+        definitions = await asyncio.to_thread(get_word_definitions, word, language_id)
+    except DictionaryUnavailable as e:
+        _skip_unavailable(language_id, word, e, options, stats)
+        return None
+
+    prepared = _word_request(language_id, word, state, definitions, options)
+    if prepared is None or not prepared.reprocessing:
+        return prepared
+    good = await has_good_analysis_async(language_id, word, definitions, analysis_agent, options.recheck_all)
+    return _checked(language_id, prepared, good, options)
+
+
+def finish_word(language_id: str, prepared: WordRequest, output: GenerateResponse, elapsed: float,
+                options: RunOptions, stats: RunStats):
+    if options.verbose:
+        print(f"{prepared.word} ", end="")
+        print_output(elapsed, output)
+    write_result(language_id, prepared.word, output, elapsed, stats)
+
+    stats.processed_words += 1
+    if prepared.reprocessing:
+        stats.reprocessed += 1
+
+
+def make_group_prompt(requests: dict[str, dict]) -> str:
+    """
+    One prompt for several forms of the same word, the dictionary articles shared by all the forms are given once
+    next to the lemma instead of for each form
+    """
+    first = next(iter(requests.values()))
+    shared = {}
+    for dictionary, text in first["dictionary_definitions"].items():
+        article = shared_article(dictionary, text)
+        others = (request["dictionary_definitions"].get(dictionary, "") for request in requests.values())
+        # The definitions are shared objects, the same article fetched for another form is usually the same text
+        if all(other is text or shared_article(dictionary, other) == article for other in others):
+            shared[dictionary] = article
+
+    group = {
+        "source_language": first["source_language"],
+        "source_language_id": first["source_language_id"],
+    }
+    lemmas = (find_lemma(word, request["dictionary_definitions"]) for word, request in requests.items())
+    lemma = next((lemma for lemma in lemmas if lemma), None)
+    if lemma:
+        group["lemma"] = lemma
+    if shared:
+        group["dictionary_definitions"] = shared
+
+    words = []
+    for request in requests.values():
+        form = {key: value for key, value in request.items() if key not in group}
+        form["dictionary_definitions"] = {
+            dictionary: text for dictionary, text in request["dictionary_definitions"].items() if dictionary not in shared
+        }
+        if not form["dictionary_definitions"]:
+            del form["dictionary_definitions"]
+        words.append(form)
+    group["words"] = words
+
+    return format_as_xml(group, root_tag="user", item_tag="word")
+
+
+def generate_sync(agent: Agent, analysis_agent: Agent, language_id: str, word: str, state: str,
+                  options: RunOptions, stats: RunStats):
+    """
+    Generate the result for a single word, one model call at a time
+    """
+    prepared = prepare_sync(analysis_agent, language_id, word, state, options, stats)
+    if prepared is None:
+        return
+
+    ledger = get_job_ledger(language_id)
+    prompt = format_as_xml(prepared.request, root_tag="user")
+    while True:
+        try:
+            ledger.start(word)
+            start = perf_counter()
+            output = run_agent(agent, prompt)
+            elapsed = perf_counter() - start
+            break
+        except UnexpectedModelBehavior:
+            if options.verbose:
+                print(f"{word} error, retrying...")
+
+    finish_word(language_id, prepared, output, elapsed, options, stats)
+
+
+async def generate_async(agent: Agent, analysis_agent: Agent, language_id: str, word: str, state: str,
+                         options: RunOptions, stats: RunStats):
+    """
+    Generate the result for a single word, retrying only this word on bad model output
+    """
+    prepared = await prepare_async(analysis_agent, language_id, word, state, options, stats)
+    if prepared is None:
+        return
+
+    ledger = get_job_ledger(language_id)
+    prompt = format_as_xml(prepared.request, root_tag="user")
+    while True:
+        try:
+            ledger.start(word)
+            start = perf_counter()
+            output = await run_agent_async(agent, prompt)
+            elapsed = perf_counter() - start
+            break
+        except UnexpectedModelBehavior:
+            if options.verbose:
+                print(f"{word} error, retrying...")
+
+    finish_word(language_id, prepared, output, elapsed, options, stats)
+
+
+def _start_batch(language_id: str, prepared: dict[str, WordRequest],
+                 options: RunOptions) -> tuple[dict[str, dict], Callable[[dict[str, dict]], str]]:
+    """
+    Mark the words of the batch as started, and return their requests and how to make the batch prompt
+    """
+    ledger = get_job_ledger(language_id)
+    for word in prepared:
+        ledger.start(word)
+    make_prompt = make_group_prompt if options.group_lemmas else make_batch_prompt
+    return {word: p.request for word, p in prepared.items()}, make_prompt
+
+
+def _finish_batch(language_id: str, prepared: dict[str, WordRequest], outputs: dict[str, GenerateResponse],
+                  elapsed: float, options: RunOptions, stats: RunStats):
+    for word, output in outputs.items():
+        finish_word(language_id, prepared[word], output, elapsed / len(prepared), options, stats)
+
+
+def generate_batch_sync(agent: Agent, batch_agent: Agent, analysis_agent: Agent, language_id: str,
+                        words: list[tuple[str, str]], options: RunOptions, stats: RunStats):
+    """
+    Generate the results for several words with one model call, the words the model leaves out are asked again
+    """
+    prepared = [prepare_sync(analysis_agent, language_id, word, state, options, stats) for word, state in words]
+    prepared = {word_request.word: word_request for word_request in prepared if word_request is not None}
+    if not prepared:
+        return
+
+    requests, make_prompt = _start_batch(language_id, prepared, options)
+    start = perf_counter()
+    outputs = run_agent_batch(batch_agent, agent, requests, make_prompt)
+    _finish_batch(language_id, prepared, outputs, perf_counter() - start, options, stats)
+
+
+async def generate_batch_async(agent: Agent, batch_agent: Agent, analysis_agent: Agent, language_id: str,
+                               words: list[tuple[str, str]], options: RunOptions, stats: RunStats):
+    prepared = await asyncio.gather(
+        *(prepare_async(analysis_agent, language_id, word, state, options, stats) for word, state in words)
+    )
+    prepared = {word_request.word: word_request for word_request in prepared if word_request is not None}
+    if not prepared:
+        return
+
+    requests, make_prompt = _start_batch(language_id, prepared, options)
+    start = perf_counter()
+    outputs = await run_agent_batch_async(batch_agent, agent, requests, make_prompt)
+    _finish_batch(language_id, prepared, outputs, perf_counter() - start, options, stats)
+
+
+def batched(words: Iterator[tuple[str, str]], batch_size: int) -> Iterator[list[tuple[str, str]]]:
+    while batch := list(islice(words, batch_size)):
+        yield batch
+
+
+def count_batch(batch: list[tuple[str, str]], options: RunOptions, stats: RunStats):
+    stats.total_words += len(batch)
+    if options.group_lemmas and len(batch) > 1:
+        stats.groups += 1
+        stats.grouped_words += len(batch)
+
+
+def queue_language(language_id: str, options: RunOptions, retry_failed: bool, single_word: Optional[str],
+                   batch_size: int) -> tuple[Iterator[list[tuple[str, str]]], int]:
+    """
+    Bring the job ledger of the language up to date, returns the batches of words to generate and their number
+    """
+    language = conf.LANGUAGES[language_id]
+    print(f" ----- {language} -----")
+    print("")
+
+    ledger = get_job_ledger(language_id)
+    added = ledger.sync(get_word_source(language_id), get_ai_store(language_id).__contains__)
+    if added:
+        print(f"Added {added:,} new words to the job ledger")
+
+    if single_word is not None:
+        return iter([[(single_word, PENDING)]]), 1
+
+    if options.regenerate:
+        ledger.reset((GENERATED, FAILED), NEEDS_REGENERATION)
+    if retry_failed:
+        ledger.reset((FAILED,), PENDING)
+
+    # Checking goes through the generated words as well
+    states = TODO_STATES + (GENERATED,) if options.check else TODO_STATES
+    counts = ledger.count()
+    total = sum(counts[state] for state in states)
+    finished = sum(counts[state] for state in ALL_STATES if state not in states)
+    if finished:
+        print(f"Resuming, {finished:,} words are already done")
+    if options.group_lemmas:
+        grouped = ledger.group(lambda words: find_cached_lemmas(words, language_id), LEMMA_FINDERS_VERSION)
+        if grouped:
+            print(f"Found the lemmas of {grouped:,} words")
+        return ledger.claim_groups(states, max_words=conf.LLM_GROUP_MAX_WORDS), total
+    return batched(ledger.claim_words(states), batch_size), total
+
+
+async def run_concurrently(agent: Agent, batch_agent: Optional[Agent], analysis_agent: Agent, language_id: str,
+                           batches: Iterator[list[tuple[str, str]]], word_progress: tqdm, options: RunOptions,
+                           stats: RunStats, concurrency: int):
+    """
+    Keep up to `concurrency` words, or batches of words, in flight. Results are written as soon as each finishes.
+    """
+
+    async def _worker():
+        # The workers share the iterator, words are claimed from the ledger only as they're needed
+        for batch in batches:
+            count_batch(batch, options, stats)
+            if len(batch) == 1:
+                [(word, state)] = batch
+                await generate_async(agent, analysis_agent, language_id, word, state, options, stats)
+            else:
+                await generate_batch_async(agent, batch_agent, analysis_agent, language_id, batch, options, stats)
+            word_progress.set_description(f"{batch[-1][0]:<24}")
+            word_progress.update(len(batch))
+
+    await asyncio.gather(*(_worker() for _ in range(concurrency)))
+
+
+async def run_languages_concurrently(agent: Agent, batch_agent: Optional[Agent], analysis_agent: Agent,
+                                     languages: Iterable[str],
+                                     queue: Callable[[str], tuple[Iterator[list[tuple[str, str]]], int]],
+                                     options: RunOptions, stats: RunStats, concurrency: int):
+    for language_id in languages:
+        batches, total = queue(language_id)
+        word_progress = tqdm(total=total, colour="green", smoothing=0.05)
+        await run_concurrently(
+            agent, batch_agent, analysis_agent, language_id, batches, word_progress, options, stats, concurrency
+        )
+        word_progress.close()
+        print("")
 
 
 def main():
+    """
+    Generate the results for every word that doesn't have one yet, resuming from the job ledger.
+
+    --regenerate queues every word for regeneration, an interrupted run continues without the flag.
+    --retry-failed queues the words the model didn't understand again.
+
+    Several copies can run at the same time, e.g. with different --provider URLs, and share the work.
+
+    --batch-size sends that many words per model request, the default is set per model with LLM_BATCH_SIZE.
+    --group-lemmas sends all the forms of a word in one request instead, with the dictionary articles they share
+    given once. The lemmas are found from the cached definitions, so run prefetch first.
+    """
+    if "--provider" in sys.argv:
+        provider_idx = sys.argv.index("--provider") + 1
+        conf.OPENAI_PROVIDER = sys.argv[provider_idx]
+        conf.OPENAI_ENDPOINTS = []
+
     agent = get_ai_generate_agent()
     analysis_agent = None
 
-    verbose = False
-    check = False
-    regenerate = False
-    skip = 0
-    skip_until = None
+    options = RunOptions()
+    concurrency = 1
+    retry_failed = "--retry-failed" in sys.argv
     languages = conf.LANGUAGES
-    language_words = {
-        lang: list_words(lang)
-        for lang in conf.LANGUAGES
-    }
+    single_word = None
 
     if "--check" in sys.argv:
-        check = True
+        options.check = True
         analysis_agent = get_ai_analyze_agent()
 
+    if "--recheck-all" in sys.argv:
+        options.recheck_all = True
+
     if "--regenerate" in sys.argv:
-        regenerate = True
+        options.regenerate = True
 
     if "--verbose" in sys.argv:
-        verbose = True
+        options.verbose = True
+
+    if "--group-lemmas" in sys.argv:
+        options.group_lemmas = True
 
-    if "--skip" in sys.argv:
-        skip_idx = sys.argv.index("--skip") + 1
-        skip = int(sys.argv[skip_idx])
+    if "--no-cache" in sys.argv:
+        get_llm_cache().size = 0
 
-    if "--skip-until" in sys.argv:
-        skip_until_idx = sys.argv.index("--skip-until") + 1
-        skip_until = sys.argv[skip_until_idx]
+    if "--concurrency" in sys.argv:
+        concurrency_idx = sys.argv.index("--concurrency") + 1
+        concurrency = max(int(sys.argv[concurrency_idx]), 1)
 
     if "--language" in sys.argv:
         language_idx = sys.argv.index("--language") + 1
@@ -83,107 +484,88 @@ def main():
 
     if "--word" in sys.argv:
         word_idx = sys.argv.index("--word") + 1
-        language_words = {
-            lang: [sys.argv[word_idx]]
-            for lang in conf.LANGUAGES
-        }
+        single_word = normalize_word(sys.argv[word_idx])
+
+    batch_size = get_batch_size(agent)
+    if "--batch-size" in sys.argv:
+        batch_size_idx = sys.argv.index("--batch-size") + 1
+        batch_size = max(int(sys.argv[batch_size_idx]), 1)
+    batch_agent = get_ai_generate_agent(batched=True) if batch_size > 1 or options.group_lemmas else None
 
     total_start = perf_counter()
-    total_words = 0
-    processed_words = 0
-    reprocessed = 0
+    stats = RunStats()
 
     try:
-        for language_id in languages:
-            language = conf.LANGUAGES[language_id]
-            print(f" ----- {language} -----")
-            print("")
-
-            word_list = list(language_words[language_id])
-            skip_words = min(len(word_list), skip)
-            word_list = word_list[skip_words:]
-            skip -= skip_words
-            smoothing = 1 if skip_until else 0.05
-
-            word_progress = tqdm(word_list, colour="green", smoothing=smoothing)
-            for word in word_progress:
-                if skip_until:
-                    if word == skip_until:
-                        skip_until = False
+        if concurrency > 1:
+            # One event loop for every language, the model's HTTP connections belong to the loop they were opened in
+            asyncio.run(
+                run_languages_concurrently(
+                    agent,
+                    batch_agent,
+                    analysis_agent,
+                    languages,
+                    lambda language_id: queue_language(language_id, options, retry_failed, single_word, batch_size),
+                    options,
+                    stats,
+                    concurrency,
+                )
+            )
+        else:
+            for language_id in languages:
+                batches, total = queue_language(language_id, options, retry_failed, single_word, batch_size)
+                word_progress = tqdm(total=total, colour="green", smoothing=0.05)
+                for batch in batches:
+                    word_progress.set_description(f"{batch[0][0]:<24}")
+                    count_batch(batch, options, stats)
+                    if len(batch) == 1:
+                        [(word, state)] = batch
+                        generate_sync(agent, analysis_agent, language_id, word, state, options, stats)
                     else:
-                        continue
-                else:
-                    word_progress.smoothing = 0.05
-
-                word_progress.set_description(f"{word:<24}")
-                reprocessing = False
-                total_words += 1
-                definitions = get_word_definitions(word, language_id)
-
-                while True:
-                    try:
-                        word_prop = "word_in_" + language.lower()
-                        request = {
-                            "source_language": language,
-                            "source_language_id": language_id,
-                            word_prop: word,
-                            "dictionary_definitions": definitions
-                        }
-
-                        prompt = format_as_xml(request, root_tag="user")
-
-                        if verbose:
-                            print(f"{word} ", end="")
-
-                        if is_word_defined(language_id, word):
-                            if regenerate:
-                                request["previous_analysis"] = get_word_data(language_id, word).model_dump()
-                            elif not check:
-                                if verbose:
-                                    print("... exists")
-                                break
-                            elif has_good_analysis(language_id, word, definitions, analysis_agent):
-                                if verbose:
-                                    print("... good enough")
-                                break
-                            else:
-                                reprocessing = True
-                                request["previous_analysis"] = get_word_data(language_id, word).model_dump()
-
-                        start = perf_counter()
-                        result = agent.run_sync(prompt)
-                        elapsed = perf_counter() - start
-
-                        if verbose:
-                            print_output(elapsed, result.output)
-                        if result.output.understood:
-                            write_result(language_id, word, result.output)
-
-                        processed_words += 1
-                        if reprocessing:
-                            reprocessed += 1
-                        break
-                    except UnexpectedModelBehavior:
-                        if verbose:
-                            print("Error, retrying...")
-
-            print("")
+                        generate_batch_sync(agent, batch_agent, analysis_agent, language_id, batch, options, stats)
+                    word_progress.update(len(batch))
+                word_progress.close()
+
+                print("")
     except KeyboardInterrupt:
         print("Aborting...")
         pass
+    finally:
+        # Hand the words that were in flight to the next run straight away instead of after the lease expires
+        for language_id in languages:
+            get_job_ledger(language_id).release()
+
+        # Update the per-word files the frontend loads, including when the run fails part way
+        for language_id, words in stats.written.items():
+            get_ai_store(language_id).export_word_files(words)
 
     total_elapsed = perf_counter() - total_start
-    per_word = total_elapsed / max(processed_words, 1)
-    processed_pct = processed_words / max(total_words, 1)
+    per_word = total_elapsed / max(stats.processed_words, 1)
+    processed_pct = stats.processed_words / max(stats.total_words, 1)
 
     print(
-        f"Processed {processed_words:,} ({processed_pct:.1f}%) words "
+        f"Processed {stats.processed_words:,} ({processed_pct:.1f}%) words "
         f"in {total_elapsed:.1f}s, "
         f"took on average {per_word:.1f}s per word."
     )
-
-    if check:
-        reprocessed_pct = (reprocessed / total_words) * 100
+    for language_id in languages:
+        print(get_job_ledger(language_id).summary())
+    print(get_llm_cache().summary())
+    if budget_stats.prompts:
+        print(budget_stats.summary())
+    if endpoint_summary():
+        print(endpoint_summary())
+    if batch_stats.batches:
+        print(batch_stats.summary())
+    if stats.groups:
+        print(f"Generated {stats.grouped_words:,} forms of {stats.groups:,} lemmas with one request per lemma.")
+    print(retry_stats.summary())
+    if stats.unavailable:
+        print(f"Skipped {stats.unavailable:,} words because a dictionary was unavailable, run again to retry them.")
+
+    if options.check:
+        reprocessed_pct = (stats.reprocessed / max(stats.total_words, 1)) * 100
         print(
             f"{reprocessed_pct:.1f}% of the words were missing or needed reprocessing."
         )
+        print(analysis_stats.summary())
+        print(precheck_stats.summary())
@@ -0,0 +1,238 @@
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Iterable, Iterator, Optional
+
+import orjson
+from rich import print
+
+from data_processing.settings import LANGUAGES_DST, LANGUAGES_SRC
+from data_processing.utils import GenerateResponse, write_atomic
+from data_processing.words import normalize_word
+
+
+class JsonlStore:
+    """
+    Append-only JSON Lines log with an in-memory index, the last record for each word wins
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.index: Optional[dict[str, dict]] = None
+
+    def _load(self) -> dict[str, dict]:
+        if self.index is None:
+            index = {}
+            if self.path.exists():
+                with self.path.open("rb") as f:
+                    for line in f:
+                        try:
+                            record = orjson.loads(line)
+                        except orjson.JSONDecodeError:
+                            # Partially written line from an interrupted append
+                            continue
+                        # Older logs have words as they were in the word list, the word list is normalized now
+                        word = normalize_word(record["word"])
+                        index[word] = {**record, "word": word}
+            self.index = index
+        return self.index
+
+    def __contains__(self, word: str) -> bool:
+        return word in self._load()
+
+    def __len__(self) -> int:
+        return len(self._load())
+
+    def words(self) -> Iterator[str]:
+        return iter(list(self._load()))
+
+    def get(self, word: str) -> Optional[dict]:
+        return self._load().get(word)
+
+    def put(self, word: str, record: dict):
+        self.put_many({word: record})
+
+    def put_many(self, records: dict[str, dict]):
+        """
+        Append the records with a single write, flushed to disk before the index is updated
+        """
+        if not records:
+            return
+
+        lines = b"".join(
+            orjson.dumps({**record, "word": word}) + b"\n"
+            for word, record in records.items()
+        )
+        with self.lock:
+            index = self._load()
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with self.path.open("ab") as f:
+                f.write(lines)
+                f.flush()
+                os.fsync(f.fileno())
+            for word, record in records.items():
+                index[word] = {**record, "word": word}
+
+    def compact(self):
+        """
+        Rewrite the log with only the latest record for each word
+        """
+        with self.lock:
+            index = self._load()
+            write_atomic(self.path, b"".join(orjson.dumps(record) + b"\n" for record in index.values()))
+
+
+class AIResultStore:
+    """
+    Generated results for one language, backed by languages/<language>/ai.jsonl
+
+    The log is local, the per-word files the frontend loads are the copy tracked in git. Opening the store only
+    reads the log, run ai_export after a git pull to bring changed per-word files into it.
+    """
+
+    def __init__(self, language_id: str):
+        self.language_id = language_id
+        self.log = JsonlStore(LANGUAGES_SRC / language_id / "ai.jsonl")
+        self.word_files = LANGUAGES_DST / language_id / "ai"
+        # Modification time is when the per-word files were last synced with the log
+        self.synced = LANGUAGES_SRC / language_id / "ai.synced"
+
+        if not self.log.path.exists() and self.word_files.is_dir():
+            self.import_word_files()
+
+    def __contains__(self, word: str) -> bool:
+        return word in self.log
+
+    def words(self) -> Iterator[str]:
+        return self.log.words()
+
+    def get(self, word: str) -> Optional[GenerateResponse]:
+        record = self.log.get(word)
+        if record is None:
+            return None
+        # Results are validated before they're stored
+        return GenerateResponse.model_construct(**record["result"])
+
+    def get_many(self, words: Iterable[str]) -> dict[str, GenerateResponse]:
+        result = {}
+        for word in words:
+            data = self.get(word)
+            if data is not None:
+                result[word] = data
+        return result
+
+    def put(self, word: str, output: GenerateResponse):
+        self.log.put(word, {"result": output.model_dump()})
+
+    def import_word_files(self):
+        """
+        Build the log from the per-word JSON files
+        """
+        records = {}
+        for path in sorted(self.word_files.glob("*.json")):
+            output = GenerateResponse(**orjson.loads(path.read_bytes()))
+            records[normalize_word(path.stem)] = {"result": output.model_dump()}
+        self.log.put_many(records)
+        print(f"Imported {len(records):,} {self.language_id} AI results from {self.word_files}")
+
+    def import_changed_word_files(self) -> int:
+        """
+        Import the per-word files modified since the last sync that have a different result than the log. Before
+        the first sync only words missing from the log are imported, the log may have newer unexported results.
+        """
+        if not self.word_files.is_dir():
+            return 0
+
+        synced = self.synced.stat().st_mtime_ns if self.synced.exists() else None
+        records = {}
+        with os.scandir(self.word_files) as entries:
+            for entry in entries:
+                if not entry.name.endswith(".json"):
+                    continue
+                word = normalize_word(entry.name.removesuffix(".json"))
+                record = self.log.get(word)
+                if synced is None:
+                    if record is not None:
+                        continue
+                elif entry.stat().st_mtime_ns <= synced:
+                    continue
+                result = orjson.loads(Path(entry.path).read_bytes())
+                if record is None or record["result"] != result:
+                    records[word] = {"result": GenerateResponse(**result).model_dump()}
+
+        self.log.put_many(records)
+        return len(records)
+
+    def sync_word_files(self) -> tuple[int, int]:
+        """
+        Import the per-word files changed since the last sync, then export the log over them
+
+        Returns the number of imported and written results.
+        """
+        started = time.time_ns()
+        imported = self.import_changed_word_files()
+        written = self.export_word_files()
+        self.synced.parent.mkdir(parents=True, exist_ok=True)
+        self.synced.touch()
+        os.utime(self.synced, ns=(started, started))
+        return imported, written
+
+    def export_word_files(self, words: Optional[Iterable[str]] = None) -> int:
+        """
+        Write the per-word JSON files the frontend loads, skipping files that are already up to date
+        """
+        if words is None:
+            words = self.words()
+
+        self.word_files.mkdir(parents=True, exist_ok=True)
+        written = 0
+        for word, output in self.get_many(words).items():
+            path = self.word_files / f"{word}.json"
+            contents = output.model_dump_json(indent=2).encode("utf-8")
+            try:
+                if path.read_bytes() == contents:
+                    continue
+            except FileNotFoundError:
+                pass
+            path.write_bytes(contents)
+            written += 1
+        return written
+
+
+class VerdictStore:
+    """
+    Analysis verdicts for one language, backed by languages/<language>/analysis.jsonl
+
+    Each verdict records the hash of the result and definitions it was judged against, so it only applies
+    while neither has changed.
+    """
+
+    def __init__(self, language_id: str):
+        self.log = JsonlStore(LANGUAGES_SRC / language_id / "analysis.jsonl")
+
+    def get(self, word: str, digest: str) -> Optional[bool]:
+        record = self.log.get(word)
+        if record is None or record["hash"] != digest:
+            return None
+        return record["valid"]
+
+    def put(self, word: str, digest: str, valid: bool):
+        self.log.put(word, {"hash": digest, "valid": valid})
+
+
+_stores: dict[str, AIResultStore] = {}
+_verdict_stores: dict[str, VerdictStore] = {}
+
+
+def get_ai_store(language_id: str) -> AIResultStore:
+    if language_id not in _stores:
+        _stores[language_id] = AIResultStore(language_id)
+    return _stores[language_id]
+
+
+def get_verdict_store(language_id: str) -> VerdictStore:
+    if language_id not in _verdict_stores:
+        _verdict_stores[language_id] = VerdictStore(language_id)
+    return _verdict_stores[language_id]
@@ -0,0 +1,79 @@
+import re
+from types import SimpleNamespace
+from typing import Callable
+
+import pytest
+from pydantic_ai import Agent
+from pydantic_ai.messages import (
+    ModelMessage,
+    ModelResponse,
+    ToolCallPart,
+    UserPromptPart,
+)
+from pydantic_ai.models.function import AgentInfo, FunctionModel
+
+from data_processing import ai
+from data_processing.ai import (
+    AGENT_INSTRUCTIONS,
+    _match_answers,
+    _split_missing,
+    run_agent_batch,
+)
+from data_processing.llm_cache import LLMCache
+from data_processing.utils import AnalyzeResponse, WordAnalyzeResponse
+
+REQUESTS = {word: {"word_in_estonian": word} for word in ("aasta", "aeg", "päev", "öö")}
+
+
+def test_match_answers_by_normalized_word():
+    agent = SimpleNamespace(output_type=AnalyzeResponse)
+    answers = [
+        WordAnalyzeResponse(word="AEG", valid=False),
+        WordAnalyzeResponse(word="aasta", valid=True),
+        WordAnalyzeResponse(word="tund", valid=True),
+        WordAnalyzeResponse(word="aasta", valid=False),
+    ]
+    assert _match_answers(agent, REQUESTS, answers) == {
+        "aasta": AnalyzeResponse(valid=True),
+        "aeg": AnalyzeResponse(valid=False),
+    }
+
+
+def test_split_missing_halves_unanswered_words():
+    answered = {"aasta": AnalyzeResponse(valid=True)}
+    assert _split_missing(REQUESTS, answered) == [
+        {"aeg": REQUESTS["aeg"], "päev": REQUESTS["päev"]},
+        {"öö": REQUESTS["öö"]},
+    ]
+    assert _split_missing(REQUESTS, dict.fromkeys(REQUESTS, AnalyzeResponse(valid=True))) == []
+
+
+def _model(calls: list[list[str]], answer: Callable[[list[str]], dict]) -> FunctionModel:
+    def respond(messages: list[ModelMessage], info: AgentInfo) -> ModelResponse:
+        prompt = next(part.content for part in messages[-1].parts if isinstance(part, UserPromptPart))
+        words = re.findall(r"<word_in_estonian>(.*?)</word_in_estonian>", prompt)
+        calls.append(words)
+        return ModelResponse(parts=[ToolCallPart(info.output_tools[0].name, answer(words))])
+
+    return FunctionModel(respond)
+
+
+@pytest.fixture(autouse=True)
+def no_llm_cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(ai, "get_llm_cache", lambda: LLMCache(tmp_path / "llm_cache.sqlite3", 0))
+
+
+def test_batch_asks_missing_words_again():
+    calls = []
+    # Only the first word of each batch is answered
+    batch_model = _model(calls, lambda words: {"response": [{"word": words[0], "valid": True}]})
+    batch_agent = Agent(batch_model, name="analyze_batch", instructions=AGENT_INSTRUCTIONS["analyze_batch"],
+                        output_type=list[WordAnalyzeResponse])
+    model = _model(calls, lambda words: {"valid": True})
+    agent = Agent(model, name="analyze", instructions=AGENT_INSTRUCTIONS["analyze"], output_type=AnalyzeResponse)
+
+    outputs = run_agent_batch(batch_agent, agent, REQUESTS)
+
+    assert outputs == dict.fromkeys(REQUESTS, AnalyzeResponse(valid=True))
+    # The rest are asked again in halves, down to single words
+    assert calls == [["aasta", "aeg", "päev", "öö"], ["aeg", "päev"], ["päev"], ["öö"]]
@@ -0,0 +1,441 @@
+import hashlib
+import os
+import sqlite3
+import sys
+import threading
+import time
+import zlib
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Iterable, Optional
+
+from rich import print
+
+from data_processing.settings import LANGUAGES_SRC, conf
+
+SQLITE_BATCH = 500
+MANUAL_DICTIONARY = "manual"
+
+
+@dataclass
+class CacheEntry:
+    contents: str
+    # Response validators for conditional requests
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+    # Unix time the page was last fetched or revalidated, if known
+    fetched_at: Optional[float] = None
+
+
+@dataclass
+class DedupStats:
+    language_id: str
+    definitions: int = 0
+    unique: int = 0
+    chars: int = 0
+    unique_chars: int = 0
+
+    def summary(self) -> str:
+        words_per_text = self.definitions / max(self.unique, 1)
+        stored = self.unique_chars / max(self.chars, 1)
+        return (
+            f"{self.language_id} definitions: {self.definitions:,} words share {self.unique:,} unique texts "
+            f"({words_per_text:.2f} words per text), {stored:.0%} of the text needs to be stored."
+        )
+
+
+def text_hash(text: str) -> str:
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def share_text(text: str) -> str:
+    """
+    Identical definitions of different words are returned as the same object, so they take memory once and
+    comparing them is an identity check
+    """
+    return sys.intern(text)
+
+
+class DictionaryCache(ABC):
+    """
+    Storage for dictionary definitions, keyed by (language, dictionary, word)
+    """
+
+    @abstractmethod
+    def get_entries(self, language_id: str, dictionary: str, words: Iterable[str]) -> dict[str, CacheEntry]:
+        """
+        Get the cache entries for the words, missing words are left out of the result
+        """
+
+    @abstractmethod
+    def put_entries(self, language_id: str, dictionary: str, entries: dict[str, CacheEntry]):
+        pass
+
+    @abstractmethod
+    def touch(self, language_id: str, dictionary: str, word: str, fetched_at: float):
+        """
+        Mark the entry as revalidated without changing it
+        """
+
+    @abstractmethod
+    def dedup_stats(self, language_id: str) -> DedupStats:
+        """
+        How many of the definitions of the language have the same text
+        """
+
+    def prune(self):
+        """
+        Remove stored texts no definition refers to any more
+        """
+        pass
+
+    def get(self, language_id: str, dictionary: str, word: str) -> Optional[str]:
+        entry = self.get_entries(language_id, dictionary, [word]).get(word)
+        return entry.contents if entry else None
+
+    def get_many(self, language_id: str, dictionary: str, words: Iterable[str]) -> dict[str, str]:
+        """
+        Get the cached definitions for the words, missing words are left out of the result
+        """
+        return {
+            word: entry.contents
+            for word, entry in self.get_entries(language_id, dictionary, words).items()
+        }
+
+    def put(self, language_id: str, dictionary: str, word: str, contents: str):
+        self.put_many(language_id, dictionary, {word: contents})
+
+    def put_many(self, language_id: str, dictionary: str, items: dict[str, str]):
+        now = time.time()
+        self.put_entries(language_id, dictionary, {
+            word: CacheEntry(contents, fetched_at=now)
+            for word, contents in items.items()
+        })
+
+
+class FileCache(DictionaryCache):
+    """
+    One text file per word in languages/<language>/<dictionary>/<word>.txt, these files are the copy of the
+    definitions tracked in git whichever backend is configured.
+
+    There's nowhere to keep response validators, the file modification time is used as the fetch time.
+    """
+
+    def __init__(self, root: Path):
+        self.root = root
+        self.created: set[Path] = set()
+
+    def path(self, language_id: str, dictionary: str, word: str) -> Path:
+        dictionary_path = self.root / language_id / dictionary
+        if dictionary_path not in self.created:
+            dictionary_path.mkdir(parents=True, exist_ok=True)
+            self.created.add(dictionary_path)
+        return dictionary_path / f"{word}.txt"
+
+    def get_entries(self, language_id: str, dictionary: str, words: Iterable[str]) -> dict[str, CacheEntry]:
+        result = {}
+        for word in words:
+            path = self.path(language_id, dictionary, word)
+            try:
+                with path.open() as f:
+                    result[word] = CacheEntry(share_text(f.read()), fetched_at=os.fstat(f.fileno()).st_mtime)
+            except FileNotFoundError:
+                continue
+        return result
+
+    def put_entries(self, language_id: str, dictionary: str, entries: dict[str, CacheEntry]):
+        for word, entry in entries.items():
+            self.path(language_id, dictionary, word).write_text(entry.contents)
+
+    def touch(self, language_id: str, dictionary: str, word: str, fetched_at: float):
+        os.utime(self.path(language_id, dictionary, word), (fetched_at, fetched_at))
+
+    def dedup_stats(self, language_id: str) -> DedupStats:
+        stats = DedupStats(language_id)
+        seen = set()
+        language_path = self.root / language_id
+        for path in sorted(language_path.glob("*/*.txt")):
+            if path.parent.name == MANUAL_DICTIONARY:
+                continue
+            text = path.read_text()
+            digest = text_hash(text)
+            stats.definitions += 1
+            stats.chars += len(text)
+            if digest not in seen:
+                seen.add(digest)
+                stats.unique += 1
+                stats.unique_chars += len(text)
+        return stats
+
+
+class SqliteDatabase:
+    """
+    A SQLite database file shared between threads, reconnecting in forked processes
+    """
+
+    SCHEMA = ""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.pid = None
+        self.connection: Optional[sqlite3.Connection] = None
+
+    def _connect(self) -> sqlite3.Connection:
+        # Connections can't be shared with forked worker processes
+        if self.connection is None or self.pid != os.getpid():
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self.connection = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+            self.connection.execute("PRAGMA journal_mode=WAL")
+            self.connection.execute("PRAGMA synchronous=NORMAL")
+            self.connection.executescript(self.SCHEMA)
+            self._upgrade(self.connection)
+            self.pid = os.getpid()
+        return self.connection
+
+    def _upgrade(self, connection: sqlite3.Connection):
+        """
+        Bring databases created by older versions up to date with SCHEMA
+        """
+        pass
+
+
+class SqliteCache(SqliteDatabase, DictionaryCache):
+    """
+    All the definitions in a single SQLite database file, a local index that isn't tracked in git.
+
+    With a `mirror`, words missing from the database are looked up from the mirror and added to the database, and
+    new definitions are written to the mirror as well. The file cache is the mirror by default, so a fresh clone
+    starts from the committed definitions and newly fetched ones can be committed.
+
+    Each distinct text is stored once, keyed by its hash, and the definitions refer to it by the hash. Many forms of
+    a word get the same article, and every word a dictionary doesn't have gets the same "not found" text.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS texts (
+            hash TEXT PRIMARY KEY,
+            contents TEXT NOT NULL
+        ) WITHOUT ROWID;
+        CREATE TABLE IF NOT EXISTS definitions (
+            language TEXT NOT NULL,
+            dictionary TEXT NOT NULL,
+            word TEXT NOT NULL,
+            hash TEXT NOT NULL,
+            etag TEXT,
+            last_modified TEXT,
+            fetched_at REAL,
+            PRIMARY KEY (language, dictionary, word)
+        ) WITHOUT ROWID;
+    """
+
+    def __init__(self, path: Path, mirror: Optional[DictionaryCache] = None):
+        super().__init__(path)
+        self.mirror = mirror
+
+    def _upgrade(self, connection: sqlite3.Connection):
+        columns = {row[1] for row in connection.execute("PRAGMA table_info(definitions)")}
+        for column, column_type in (("etag", "TEXT"), ("last_modified", "TEXT"), ("fetched_at", "REAL")):
+            if column not in columns:
+                connection.execute(f"ALTER TABLE definitions ADD COLUMN {column} {column_type}")
+
+        if "contents" in columns:
+            # Move the texts of older databases to the texts table
+            connection.create_function("text_hash", 1, text_hash, deterministic=True)
+            with connection:
+                connection.execute("ALTER TABLE definitions ADD COLUMN hash TEXT")
+                connection.execute(
+                    "INSERT OR IGNORE INTO texts (hash, contents) SELECT text_hash(contents), contents FROM definitions"
+                )
+                connection.execute("UPDATE definitions SET hash = text_hash(contents)")
+                connection.execute("ALTER TABLE definitions DROP COLUMN contents")
+            connection.execute("VACUUM")
+
+    def get_entries(self, language_id: str, dictionary: str, words: Iterable[str]) -> dict[str, CacheEntry]:
+        words = list(words)
+        result = self._get_entries(language_id, dictionary, words)
+        if self.mirror is not None and len(result) < len(words):
+            found = self.mirror.get_entries(language_id, dictionary, (word for word in words if word not in result))
+            if found:
+                self._put_entries(language_id, dictionary, found)
+                result.update(found)
+        return result
+
+    def _get_entries(self, language_id: str, dictionary: str, words: list[str]) -> dict[str, CacheEntry]:
+        result = {}
+        with self.lock:
+            connection = self._connect()
+            for start in range(0, len(words), SQLITE_BATCH):
+                batch = words[start:start + SQLITE_BATCH]
+                placeholders = ", ".join("?" * len(batch))
+                rows = connection.execute(
+                    "SELECT word, contents, etag, last_modified, fetched_at FROM definitions JOIN texts USING (hash) "
+                    f"WHERE language = ? AND dictionary = ? AND word IN ({placeholders})",  # nosec: B608
+                    (language_id, dictionary, *batch),
+                )
+                for word, contents, *fields in rows:
+                    result[word] = CacheEntry(share_text(contents), *fields)
+        return result
+
+    def put_entries(self, language_id: str, dictionary: str, entries: dict[str, CacheEntry]):
+        self._put_entries(language_id, dictionary, entries)
+        if self.mirror is not None:
+            self.mirror.put_entries(language_id, dictionary, entries)
+
+    def _put_entries(self, language_id: str, dictionary: str, entries: dict[str, CacheEntry]):
+        hashes = {word: text_hash(e.contents) for word, e in entries.items()}
+        with self.lock:
+            connection = self._connect()
+            with connection:
+                connection.executemany(
+                    "INSERT OR IGNORE INTO texts (hash, contents) VALUES (?, ?)",
+                    {(hashes[word], e.contents) for word, e in entries.items()},
+                )
+                connection.executemany(
+                    "INSERT OR REPLACE INTO definitions "
+                    "(language, dictionary, word, hash, etag, last_modified, fetched_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (
+                        (language_id, dictionary, word, hashes[word], e.etag, e.last_modified, e.fetched_at)
+                        for word, e in entries.items()
+                    ),
+                )
+
+    def touch(self, language_id: str, dictionary: str, word: str, fetched_at: float):
+        with self.lock:
+            connection = self._connect()
+            with connection:
+                connection.execute(
+                    "UPDATE definitions SET fetched_at = ? WHERE language = ? AND dictionary = ? AND word = ?",
+                    (fetched_at, language_id, dictionary, word),
+                )
+
+    def dedup_stats(self, language_id: str) -> DedupStats:
+        with self.lock:
+            connection = self._connect()
+            definitions, unique, chars = connection.execute(
+                "SELECT COUNT(*), COUNT(DISTINCT hash), COALESCE(SUM(LENGTH(contents)), 0) "
+                "FROM definitions JOIN texts USING (hash) WHERE language = ?",
+                (language_id,),
+            ).fetchone()
+            unique_chars = connection.execute(
+                "SELECT COALESCE(SUM(LENGTH(contents)), 0) FROM texts "
+                "WHERE hash IN (SELECT hash FROM definitions WHERE language = ?)",
+                (language_id,),
+            ).fetchone()[0]
+        return DedupStats(language_id, definitions, unique, chars, unique_chars)
+
+    def prune(self):
+        with self.lock:
+            connection = self._connect()
+            with connection:
+                connection.execute("DELETE FROM texts WHERE hash NOT IN (SELECT hash FROM definitions)")
+
+
+class RawArchive(SqliteDatabase):
+    """
+    Compressed raw pages of one dictionary, keyed by word, so definitions can be extracted again offline
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS pages (
+            word TEXT PRIMARY KEY,
+            html BLOB NOT NULL
+        ) WITHOUT ROWID;
+    """
+
+    def put(self, word: str, html: str):
+        compressed = zlib.compress(html.encode("utf-8"))
+        with self.lock:
+            connection = self._connect()
+            with connection:
+                connection.execute("INSERT OR REPLACE INTO pages (word, html) VALUES (?, ?)", (word, compressed))
+
+    def get_compressed_many(self, words: Iterable[str]) -> dict[str, bytes]:
+        """
+        Get the compressed pages of the words, decompress them with `decompress_page`
+        """
+        words = list(words)
+        result = {}
+        with self.lock:
+            connection = self._connect()
+            for start in range(0, len(words), SQLITE_BATCH):
+                batch = words[start:start + SQLITE_BATCH]
+                placeholders = ", ".join("?" * len(batch))
+                rows = connection.execute(
+                    f"SELECT word, html FROM pages WHERE word IN ({placeholders})",  # nosec: B608
+                    batch,
+                )
+                result.update(rows)
+        return result
+
+    def get(self, word: str) -> Optional[str]:
+        compressed = self.get_compressed_many([word]).get(word)
+        return decompress_page(compressed) if compressed is not None else None
+
+
+def decompress_page(compressed: bytes) -> str:
+    return zlib.decompress(compressed).decode("utf-8")
+
+
+CACHE_BACKENDS = {
+    "files": lambda: FileCache(LANGUAGES_SRC),
+    "sqlite": lambda: SqliteCache(LANGUAGES_SRC / conf.DICTIONARY_CACHE_FILE, mirror=FileCache(LANGUAGES_SRC)),
+}
+
+_cache: Optional[DictionaryCache] = None
+
+
+def get_cache() -> DictionaryCache:
+    global _cache
+    if _cache is None:
+        _cache = CACHE_BACKENDS[conf.DICTIONARY_CACHE]()
+    return _cache
+
+
+_archives: dict[str, RawArchive] = {}
+
+
+def get_raw_archive(dictionary: str) -> RawArchive:
+    if dictionary not in _archives:
+        _archives[dictionary] = RawArchive(LANGUAGES_SRC / "raw" / f"{dictionary}.sqlite3")
+    return _archives[dictionary]
+
+
+def main():
+    """
+    Migrate the per-word text files in languages/<language>/<dictionary>/ into the configured cache backend. The
+    SQLite cache also picks them up one at a time as they're looked up, migrating them at once saves the lookups.
+    """
+    cache = get_cache()
+    if isinstance(cache, FileCache):
+        print("The configured DICTIONARY_CACHE is already the file based cache, nothing to migrate.")
+        return
+    if isinstance(cache, SqliteCache):
+        # Only fill the database, the files are already up to date
+        cache = SqliteCache(cache.path)
+
+    languages = conf.LANGUAGES
+    if "--language" in sys.argv:
+        language_idx = sys.argv.index("--language") + 1
+        languages = [sys.argv[language_idx]]
+
+    source = FileCache(LANGUAGES_SRC)
+    for language_id in languages:
+        language_path = LANGUAGES_SRC / language_id
+        if not language_path.is_dir():
+            continue
+
+        for dictionary_path in sorted(language_path.iterdir()):
+            # Manual entries are hand-written and stay as files
+            if not dictionary_path.is_dir() or dictionary_path.name == MANUAL_DICTIONARY:
+                continue
+
+            dictionary = dictionary_path.name
+            words = [path.stem for path in dictionary_path.glob("*.txt")]
+            entries = source.get_entries(language_id, dictionary, words)
+            cache.put_entries(language_id, dictionary, entries)
+            print(f"Migrated {len(entries):,} {language_id} {dictionary} definitions")
+
+        print(cache.dedup_stats(language_id).summary())
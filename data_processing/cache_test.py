@@ -0,0 +1,87 @@
+import os
+import sqlite3
+import sys
+
+import pytest
+
+from data_processing import cache
+from data_processing.cache import CacheEntry, FileCache, SqliteCache
+
+
+@pytest.fixture
+def files(tmp_path, monkeypatch) -> FileCache:
+    monkeypatch.setattr(cache, "LANGUAGES_SRC", tmp_path)
+    files = FileCache(tmp_path)
+    files.put_many("et", "ekss", {"aasta": "aasta\nyear", "aastad": "aasta\nyear"})
+    files.put_many("et", "manual", {"aasta": "hand-written"})
+    return files
+
+
+def test_migrate_files_to_sqlite(files: FileCache, tmp_path, monkeypatch):
+    sqlite = SqliteCache(tmp_path / "cache.sqlite3", mirror=files)
+    monkeypatch.setattr(cache, "_cache", sqlite)
+    monkeypatch.setattr(sys, "argv", ["migrate_cache", "--language", "et"])
+    path = files.path("et", "ekss", "aasta")
+    os.utime(path, (1000, 1000))
+
+    cache.main()
+
+    migrated = SqliteCache(sqlite.path)
+    assert migrated.get_many("et", "ekss", ["aasta", "aastad"]) == {"aasta": "aasta\nyear", "aastad": "aasta\nyear"}
+    assert migrated.get_entries("et", "ekss", ["aasta"])["aasta"].fetched_at == 1000
+    assert migrated.get("et", "manual", "aasta") is None
+    assert migrated.dedup_stats("et").unique == 1
+    # The files were only read
+    assert path.stat().st_mtime == 1000
+
+
+def test_sqlite_reads_and_writes_through_to_files(files: FileCache, tmp_path):
+    sqlite = SqliteCache(tmp_path / "cache.sqlite3", mirror=files)
+    assert sqlite.get("et", "ekss", "aasta") == "aasta\nyear"
+    assert sqlite.get("et", "ekss", "puudub") is None
+
+    sqlite.put_entries("et", "ekss", {"aeg": CacheEntry("aeg\ntime", etag='"1"', fetched_at=1.0)})
+    assert files.get("et", "ekss", "aeg") == "aeg\ntime"
+
+    # Both were stored in the database along the way
+    unmirrored = SqliteCache(sqlite.path)
+    assert unmirrored.get_many("et", "ekss", ["aasta", "aeg"]) == {"aasta": "aasta\nyear", "aeg": "aeg\ntime"}
+    assert unmirrored.get_entries("et", "ekss", ["aeg"])["aeg"].etag == '"1"'
+
+
+def test_upgrade_moves_texts_to_texts_table(tmp_path):
+    path = tmp_path / "cache.sqlite3"
+    connection = sqlite3.connect(path)
+    with connection:
+        # Schema before texts were stored by hash
+        connection.execute("""
+            CREATE TABLE definitions (
+                language TEXT NOT NULL,
+                dictionary TEXT NOT NULL,
+                word TEXT NOT NULL,
+                contents TEXT NOT NULL,
+                etag TEXT,
+                PRIMARY KEY (language, dictionary, word)
+            ) WITHOUT ROWID
+        """)
+        connection.executemany(
+            "INSERT INTO definitions (language, dictionary, word, contents, etag) VALUES (?, ?, ?, ?, ?)",
+            [
+                ("et", "ekss", "aasta", "aasta\nyear", '"1"'),
+                ("et", "ekss", "aastad", "aasta\nyear", None),
+                ("et", "wiktionary", "aasta", "Estonian\naasta", None),
+            ],
+        )
+    connection.close()
+
+    upgraded = SqliteCache(path)
+    entries = upgraded.get_entries("et", "ekss", ["aasta", "aastad"])
+    assert entries == {
+        "aasta": CacheEntry("aasta\nyear", etag='"1"'),
+        "aastad": CacheEntry("aasta\nyear"),
+    }
+    assert upgraded.get("et", "wiktionary", "aasta") == "Estonian\naasta"
+
+    columns = {row[1] for row in upgraded._connect().execute("PRAGMA table_info(definitions)")}
+    assert "contents" not in columns
+    assert upgraded._connect().execute("SELECT COUNT(*) FROM texts").fetchone()[0] == 2
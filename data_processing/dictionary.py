@@ -1,42 +1,235 @@
+import re
+import threading
+import time
+from dataclasses import dataclass, replace
 from pathlib import Path
 from typing import Optional
-from urllib.parse import urljoin, urlparse, parse_qsl, urlencode, urlunparse
+from urllib.parse import parse_qsl, urlencode, urljoin, urlparse, urlunparse
 
 import bs4
 import requests
-from bs4 import BeautifulSoup, PageElement, NavigableString, Tag
+from bs4 import BeautifulSoup, NavigableString, PageElement, Tag
+from requests.adapters import HTTPAdapter
 
+from data_processing.cache import CacheEntry, get_cache, get_raw_archive, share_text
 from data_processing.settings import LANGUAGES_SRC, conf
-from data_processing.utils import retry
+from data_processing.utils import RetryableError, is_retryable, retry
+from data_processing.words import normalize_word
 
 NO_RESULTS = "No definition found in dictionary."
 USER_AGENT = "curl/8.16.0"
 DEBUG = False
+REQUEST_TIMEOUT = 30
+
+
+class HostRateLimiter:
+    """
+    Spaces out requests to each host so concurrent fetches stay polite to the dictionary servers
+    """
+
+    def __init__(self, requests_per_second: float):
+        self.interval = 1 / requests_per_second if requests_per_second > 0 else 0
+        self.lock = threading.Lock()
+        self.next_slot: dict[str, float] = {}
+
+    def wait(self, url: str):
+        host = urlparse(url).netloc
+        with self.lock:
+            now = time.monotonic()
+            slot = max(now, self.next_slot.get(host, now))
+            self.next_slot[host] = slot + self.interval
+        delay = slot - now
+        if delay > 0:
+            time.sleep(delay)
+
+
+class DictionaryUnavailable(RetryableError):
+    """
+    The dictionary couldn't be reached or had a server error, as opposed to not having the word
+    """
+
+
+class HostUnavailable(DictionaryUnavailable):
+    """
+    Requests to the host are stopped after repeated failures
+    """
+
+
+class UnexpectedResponse(DictionaryUnavailable):
+    """
+    The dictionary answered with something other than the page or a "not found", e.g. 403 when blocked. Not cached
+    as a definition, but not retried right away either.
+    """
+
+
+class HostCircuitBreaker:
+    """
+    Stops requests to a host after repeated failures, so an outage fails fast instead of every word waiting on it.
+    After the cooldown a single request is let through to check if the host has recovered.
+    """
+
+    def __init__(self, max_failures: int, cooldown: float):
+        self.max_failures = max_failures
+        self.cooldown = cooldown
+        self.lock = threading.Lock()
+        self.failures: dict[str, int] = {}
+        self.open_until: dict[str, float] = {}
+
+    def check(self, url: str):
+        host = urlparse(url).netloc
+        with self.lock:
+            open_until = self.open_until.get(host)
+            if open_until is None:
+                return
+            now = time.monotonic()
+            if now < open_until:
+                raise HostUnavailable(f"{host} is unavailable, trying again in {open_until - now:.0f}s")
+            # Let this request through, the others keep failing fast until it's done
+            self.open_until[host] = now + self.cooldown
+
+    def success(self, url: str):
+        host = urlparse(url).netloc
+        with self.lock:
+            self.failures.pop(host, None)
+            self.open_until.pop(host, None)
+
+    def failure(self, url: str):
+        host = urlparse(url).netloc
+        with self.lock:
+            failures = self.failures.get(host, 0) + 1
+            self.failures[host] = failures
+            if failures >= self.max_failures:
+                self.open_until[host] = time.monotonic() + self.cooldown
+
+
+class RecentFailures:
+    """
+    Words that recently failed to fetch, they fail fast until the TTL has passed instead of being requested again
+    """
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.failed: dict[tuple[str, str], tuple[float, str]] = {}
+
+    def check(self, dictionary: str, word: str):
+        key = (dictionary, word)
+        with self.lock:
+            failure = self.failed.get(key)
+            if failure is None:
+                return
+            failed_at, error = failure
+            if time.monotonic() - failed_at < self.ttl:
+                raise DictionaryUnavailable(error)
+            del self.failed[key]
+
+    def add(self, dictionary: str, word: str, error: str):
+        with self.lock:
+            self.failed[(dictionary, word)] = (time.monotonic(), error)
+
+
+def _is_retryable_fetch(e: BaseException) -> bool:
+    # Waiting for the circuit breaker would only stall the caller, an unexpected response would come back the same
+    return is_retryable(e) and not isinstance(e, (HostUnavailable, UnexpectedResponse))
+
+
+def _mount_adapter(session: requests.Session, workers: int):
+    adapter = HTTPAdapter(
+        pool_connections=4,
+        pool_maxsize=workers,
+    )
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+
+
+def _make_session() -> requests.Session:
+    session = requests.Session()
+    _mount_adapter(session, conf.DICTIONARY_PREFETCH_WORKERS)
+    session.headers.update({
+        "User-Agent": USER_AGENT,
+        "Accept": "*/*",
+    })
+    return session
+
+
+@dataclass
+class ParseStats:
+    pages: int = 0
+    seconds: float = 0.0
+
+    def summary(self) -> str:
+        per_page = self.seconds / max(self.pages, 1)
+        return f"Parsed {self.pages:,} pages with {HTML_PARSER} in {self.seconds:.1f}s, {per_page * 1000:.1f}ms per page."
+
+
+def _html_parser() -> str:
+    """
+    The configured BeautifulSoup tree builder, or the built-in one if it's not installed
+    """
+    try:
+        BeautifulSoup("", conf.HTML_PARSER)
+        return conf.HTML_PARSER
+    except bs4.FeatureNotFound:
+        print(f"HTML parser {conf.HTML_PARSER} is not available, falling back to html.parser")
+        return "html.parser"
+
+
+SESSION = _make_session()
+RATE_LIMITER = HostRateLimiter(conf.DICTIONARY_REQUESTS_PER_SECOND)
+CIRCUIT_BREAKER = HostCircuitBreaker(conf.DICTIONARY_BREAKER_FAILURES, conf.DICTIONARY_BREAKER_COOLDOWN)
+RECENT_FAILURES = RecentFailures(conf.DICTIONARY_FAILURE_TTL)
+HTML_PARSER = _html_parser()
+parse_stats = ParseStats()
+
+
+def set_fetch_workers(workers: int):
+    """
+    Keep a pooled connection per host for each of the threads fetching pages at the same time
+    """
+    _mount_adapter(SESSION, workers)
+
+
+# The list of non-displayed tags from the W3C specs, we also behave is if scripting is enabled (noscript is ignored)
+HIDDEN_TAGS = frozenset((
+    'area', 'base', 'basefont', 'datalist', 'head', 'link', 'meta', 'noembed', 'noframes', 'param', 'rp', 'script',
+    'source', 'style', 'template', 'track', 'title', 'noscript',
+))
+
+
+def _is_hidden(tag: Tag) -> bool:
+    return (
+        tag.name in HIDDEN_TAGS or
+        tag.has_attr('hidden') or
+        (tag.name == 'input' and tag.get('type') == 'hidden')
+    )
 
 
 def html_to_text(content):
     """
     Creates a formatted text email message as a string from a rendered html template (page)
     https://gist.github.com/racitup/2ded9c06c2563049e7e12b25bf2a8369
+
+    Hidden subtrees are skipped once while walking the tree, instead of checking every parent of every string.
     """
+    # Everything is hidden if the content itself is inside a non-displayed tag
+    for tag in (content, *content.parents):
+        if type(tag) is Tag and _is_hidden(tag):
+            return ""
+
     text = []
-    for element in content.descendants:
-        # We use type and not isinstance since comments, cdata, etc are subclasses that we don't want
-        if type(element) == NavigableString:
-            parent_tags = (t for t in element.parents if type(t) == Tag)
-            hidden = False
-            for parent_tag in parent_tags:
+    stack = [iter(content.contents)]
+    while stack:
+        for element in stack[-1]:
+            element_type = type(element)
+            if isinstance(element, Tag):
                 # Ignore any text inside a non-displayed tag
-                # We also behave is if scripting is enabled (noscript is ignored)
-                # The list of non-displayed tags and attributes from the W3C specs:
-                if (parent_tag.name in ('area', 'base', 'basefont', 'datalist', 'head', 'link',
-                                        'meta', 'noembed', 'noframes', 'param', 'rp', 'script',
-                                        'source', 'style', 'template', 'track', 'title', 'noscript') or
-                    parent_tag.has_attr('hidden') or
-                    (parent_tag.name == 'input' and parent_tag.get('type') == 'hidden')):
-                    hidden = True
+                if element_type is not Tag or not _is_hidden(element):
+                    stack.append(iter(element.contents))
                     break
-            if hidden:
+                continue
+
+            # We use type and not isinstance since comments, cdata, etc are subclasses that we don't want
+            if element_type is not NavigableString:
                 continue
 
             # remove any multiple and leading/trailing whitespace
@@ -47,7 +240,7 @@ def html_to_text(content):
                     # replace link text with the link
                     string = a_tag['href']
                     # concatenate with any non-empty immediately previous string
-                    if (type(a_tag.previous_sibling) == NavigableString and
+                    if (type(a_tag.previous_sibling) is NavigableString and
                         a_tag.previous_sibling.string.strip()):
                         text[-1] = text[-1] + ' ' + string
                         continue
@@ -58,11 +251,37 @@ def html_to_text(content):
                     # Add extra paragraph formatting newline
                     string = '\n' + string
                 text += [string]
+        else:
+            stack.pop()
+
     doc = '\n'.join(text)
     return doc
 
 
-def fetch_html(url: str) -> Optional[BeautifulSoup]:
+def parse_html(content: str, parser: Optional[str] = None) -> BeautifulSoup:
+    start = time.perf_counter()
+    soup = BeautifulSoup(content, parser or HTML_PARSER)
+    parse_stats.pages += 1
+    parse_stats.seconds += time.perf_counter() - start
+    return soup
+
+
+@dataclass
+class Page:
+    html: Optional[str]
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+    not_modified: bool = False
+
+
+@retry(retries=conf.DICTIONARY_RETRIES, deadline=conf.DICTIONARY_RETRY_DEADLINE, retry_on=_is_retryable_fetch)
+def request_page(url: str, etag: Optional[str] = None, last_modified: Optional[str] = None) -> Optional[Page]:
+    """
+    Get the page, as a conditional request if validators from a previous response are given.
+
+    Returns None if the dictionary doesn't have the page (404 or 410), raises DictionaryUnavailable on connection
+    errors, throttling and server errors, and UnexpectedResponse on any other response.
+    """
     content = None
     content_bypass = Path(".") / "response.txt"
 
@@ -70,41 +289,62 @@ def fetch_html(url: str) -> Optional[BeautifulSoup]:
         if content_bypass.exists():
             content = content_bypass.read_text()
             print(f"Reading {url} from file.")
+            return Page(content)
 
-    if not content:
-        response = requests.get(url, headers={
-            "User-Agent": USER_AGENT,
-            "Accept": "*/*",
-        })
+    headers = {}
+    if etag:
+        headers["If-None-Match"] = etag
+    if last_modified:
+        headers["If-Modified-Since"] = last_modified
 
-        if response.status_code != 200:
-            return None
-        if not response.headers.get("content-type").startswith("text/html"):
-            return None
-        response.encoding = "utf-8"
-        content = response.text
-        if DEBUG:
-            content_bypass.write_text(content, encoding="utf-8")
+    CIRCUIT_BREAKER.check(url)
+    RATE_LIMITER.wait(url)
+    try:
+        response = SESSION.get(url, headers=headers, timeout=REQUEST_TIMEOUT)
+    except requests.RequestException as e:
+        CIRCUIT_BREAKER.failure(url)
+        raise DictionaryUnavailable(f"Failed to fetch {url}: {e}") from e
+
+    if response.status_code == 429 or response.status_code >= 500:
+        CIRCUIT_BREAKER.failure(url)
+        raise DictionaryUnavailable(f"{url} returned {response.status_code}")
+    CIRCUIT_BREAKER.success(url)
+
+    if response.status_code == 304:
+        return Page(None, etag, last_modified, not_modified=True)
+    if response.status_code in (404, 410):
+        return None
+    if response.status_code != 200:
+        raise UnexpectedResponse(f"{url} returned {response.status_code}")
+    content_type = response.headers.get("content-type", "")
+    if not content_type.startswith("text/html"):
+        raise UnexpectedResponse(f"{url} returned {content_type or 'no content type'} instead of HTML")
+    response.encoding = "utf-8"
+    content = response.text
+    if DEBUG:
+        content_bypass.write_text(content, encoding="utf-8")
+
+    return Page(content, response.headers.get("etag"), response.headers.get("last-modified"))
 
-    return BeautifulSoup(content, "html.parser")
 
+def fetch_page(url: str) -> Optional[str]:
+    page = request_page(url)
+    return page.html if page else None
 
-def word_cache_path(word, language_id, dictionary) -> Path:
-    dictionary_path = LANGUAGES_SRC / language_id / dictionary
-    dictionary_path.mkdir(parents=True, exist_ok=True)
-    return dictionary_path / f"{word}.txt"
+
+def fetch_html(url: str) -> Optional[BeautifulSoup]:
+    content = fetch_page(url)
+    if content is None:
+        return None
+    return parse_html(content)
 
 
 def cache_word(word, language_id, dictionary, contents: str):
-    word_cache = word_cache_path(word, language_id, dictionary)
-    word_cache.write_text(contents)
+    get_cache().put(language_id, dictionary, word, contents)
 
 
 def get_word_cache(word, language_id, dictionary) -> Optional[str]:
-    word_cache = word_cache_path(word, language_id, dictionary)
-    if word_cache.exists():
-        return word_cache.read_text()
-    return None
+    return get_cache().get(language_id, dictionary, word)
 
 
 def cleanup_html(container: BeautifulSoup | PageElement):
@@ -115,11 +355,11 @@ def cleanup_html(container: BeautifulSoup | PageElement):
     for element in container.descendants:
         element_type = type(element)
         # Remove comments
-        if element_type == bs4.element.Comment:
+        if element_type is bs4.element.Comment:
             element.extract()
             continue
 
-        if element_type != bs4.element.Tag:
+        if element_type is not bs4.element.Tag:
             continue
 
         if element.has_attr("src"):
@@ -142,23 +382,22 @@ def cleanup_html(container: BeautifulSoup | PageElement):
             del element["style"]
 
 
-@retry
+def ekss_url(word) -> str:
+    url_parts = urlparse("https://arhiiv.eki.ee/dict/ekss/index.cgi?F=M")
+    query = dict(parse_qsl(url_parts.query))
+    query.update({"Q": word})
+    return urlunparse(url_parts._replace(query=urlencode(query)))
+
+
 def ekss(word, language_id) -> Optional[str]:
     """
     Estonian dictionary
     https://arhiiv.eki.ee/dict/ekss/
     """
-    # Construct the URL
-    url_parts = urlparse("https://arhiiv.eki.ee/dict/ekss/index.cgi?F=M")
-    query = dict(parse_qsl(url_parts.query))
-    query.update({"Q": word})
-    url = urlunparse(url_parts._replace(query=urlencode(query)))
-
-    content = fetch_html(url)
+    return lookup("ekss", word, language_id)
 
-    if content is None:
-        return NO_RESULTS
 
+def ekss_extract(content: BeautifulSoup, word, language_id) -> str:
     answer = content.select_one(".tervikart")
     if answer is None:
         return NO_RESULTS
@@ -167,7 +406,7 @@ def ekss(word, language_id) -> Optional[str]:
     previous_p = [
         p
         for p in answer.previous_siblings
-        if type(p) == bs4.element.Tag and p.name == "p"
+        if type(p) is bs4.element.Tag and p.name == "p"
     ]
 
     replacement = [
@@ -176,6 +415,12 @@ def ekss(word, language_id) -> Optional[str]:
         if "Asendasin" in p.text
     ]
 
+    # The <p> is sometimes left unclosed, html.parser then nests the article in it instead of closing it like lxml
+    for p in answer.find_parents("p"):
+        note = p.find(string=re.compile("Asendasin"), recursive=False)
+        if note:
+            replacement.append(content.new_tag("p", string=str(note)))
+
     # Include the information at the top
     for element in replacement:
         answer.insert(0, element)
@@ -184,18 +429,42 @@ def ekss(word, language_id) -> Optional[str]:
     answer.smooth()
     return html_to_text(answer)
 
+
+# ekss looks up the base form of a plural and says so above the article
+EKSS_REPLACED = re.compile(r"^Asendasin '(.+?)' sõnaga '(.+?)'\n")
+
+
+def ekss_lemma(word, text: str) -> Optional[str]:
+    text = text.lstrip()
+    replaced = EKSS_REPLACED.match(text)
+    if replaced:
+        return normalize_word(replaced.group(2))
+
+    # Otherwise the article is only about the word if the headword is the word, compound parts are split with |
+    headword = text.split("\n", 1)[0].replace("|", "")
+    if normalize_word(headword) == word:
+        return word
+    return None
+
+
+def ekss_strip_replaced(text: str) -> str:
+    return EKSS_REPLACED.sub("", text.lstrip(), count=1)
+
+
+def wiktionary_url(word) -> str:
+    return urljoin("https://en.wiktionary.org/wiki/", word)
+
+
 def wiktionary(word, language_id) -> Optional[str]:
     """
     Multilingual wiki based dictionary
     https://wiktionary.org/
     """
-    language = conf.LANGUAGES[language_id]
-    url = urljoin("https://en.wiktionary.org/wiki/", word)
-    content = fetch_html(url)
+    return lookup("wiktionary", word, language_id)
 
-    if content is None:
-        return NO_RESULTS
 
+def wiktionary_extract(content: BeautifulSoup, word, language_id) -> str:
+    language = conf.LANGUAGES[language_id]
     try:
         header = f"h2#{language}"
         heading_block = content.select_one(header).parent
@@ -209,7 +478,7 @@ def wiktionary(word, language_id) -> Optional[str]:
         for elem in heading_block.next_siblings:
             if remove:
                 elem.extract()
-            if type(elem) == bs4.element.Tag:
+            if type(elem) is bs4.element.Tag:
                 if elem.has_attr("class") and "mw-heading2" in elem["class"]:
                     remove = True
                     elem.extract()
@@ -226,7 +495,7 @@ def wiktionary(word, language_id) -> Optional[str]:
     if further_reading:
         cont = further_reading.parent
         ul = cont.next_sibling
-        while type(ul) != bs4.element.Tag or ul.name != "ul":
+        while type(ul) is not bs4.element.Tag or ul.name != "ul":
             ul = ul.next_sibling
 
         ul.extract()
@@ -237,7 +506,7 @@ def wiktionary(word, language_id) -> Optional[str]:
     if anagrams:
         cont = anagrams.parent
         ul = cont.next_sibling
-        while type(ul) != bs4.element.Tag or ul.name != "ul":
+        while type(ul) is not bs4.element.Tag or ul.name != "ul":
             ul = ul.next_sibling
 
         ul.extract()
@@ -251,6 +520,47 @@ def wiktionary(word, language_id) -> Optional[str]:
     return text
 
 
+# Inflection tables name the lemma they inflect, which is the word itself on the page of a lemma
+WIKTIONARY_TABLE = re.compile(
+    r"(?m)^(?:Declension|Conjugation|Inflection)\n+(?:Inflection|Conjugation|Declension) of\n+(\S+)\n"
+)
+# Inflected forms link to their lemma, e.g. "essive singular of" followed by "aika". A form with a meaning of its
+# own continues with it, e.g. "nominative plural of" "se" ": they, those".
+WIKTIONARY_FORM_OF = re.compile(
+    r"(?m)^(?:[a-z\-]+ )*"
+    r"(?:singular|plural|inflection|participle|infinitive|indicative|conditional|imperative|potential|connegative)"
+    r"(?: [a-z\-]+)* of\n+([^\W\d_][\w\-]*)$(?:\n(: \S))?"
+)
+# Headings of the sections an entry has for each part of speech
+WIKTIONARY_PART_OF_SPEECH = (
+    "(?:Noun|Proper noun|Verb|Participle|Adjective|Adverb|Pronoun|Determiner|Numeral|Postposition|Preposition|"
+    "Conjunction|Interjection|Particle|Suffix|Prefix|Phrase|Contraction|Abbreviation)"
+)
+
+
+def wiktionary_lemma(word, text: str) -> Optional[str]:
+    """
+    The lemma all the tables and form-of definitions on the page agree on. None for homographs, e.g. "kukin" is
+    both a pronoun and a form of "kukka", and for forms with a meaning of their own like "ne", so they aren't
+    grouped under another word.
+    """
+    lemmas = {normalize_word(match.group(1)) for match in WIKTIONARY_TABLE.finditer(text)}
+    found = bool(lemmas)
+    # Each part of speech starts with its heading followed by the headword
+    sections = re.split(rf"(?m)^{WIKTIONARY_PART_OF_SPEECH}\n(?i:{re.escape(word)})\n", text)[1:] or [text]
+    for section in sections:
+        forms = list(WIKTIONARY_FORM_OF.finditer(section))
+        # A section that isn't only about another word defines the word itself
+        if not forms or any(match.group(2) for match in forms):
+            lemmas.add(word)
+        lemmas.update(normalize_word(match.group(1)) for match in forms)
+        found = found or bool(forms)
+
+    if found and len(lemmas) == 1:
+        return lemmas.pop()
+    return None
+
+
 def manual_information(word, language_id) -> Optional[str]:
     manual_dictionary = LANGUAGES_SRC / language_id / "manual"
     manual_dictionary.mkdir(parents=True, exist_ok=True)
@@ -260,29 +570,172 @@ def manual_information(word, language_id) -> Optional[str]:
     return None
 
 
+# URL builder and extractor of each dictionary
+DICTIONARIES = {
+    "ekss": (ekss_url, ekss_extract),
+    "wiktionary": (wiktionary_url, wiktionary_extract),
+}
+
+
+# Finds the lemma of a word in the extracted definition, if the dictionary tells it
+LEMMA_FINDERS = {
+    "ekss": ekss_lemma,
+    "wiktionary": wiktionary_lemma,
+}
+# Change when the lemma finders do, so the lemmas stored in the job ledgers are found again
+LEMMA_FINDERS_VERSION = "2"
+
+# Text the article of a word shares with the articles of its other forms
+ARTICLE_CLEANERS = {
+    "ekss": ekss_strip_replaced,
+}
+
+
+def fetch_raw(dictionary: str, word, cached: Optional[CacheEntry] = None) -> Optional[Page]:
+    """
+    Fetch the dictionary page for the word, revalidating the cached entry if there is one, and archive it if
+    enabled. Words that failed recently fail again without a request until DICTIONARY_FAILURE_TTL has passed.
+    """
+    RECENT_FAILURES.check(dictionary, word)
+
+    make_url, _ = DICTIONARIES[dictionary]
+    try:
+        if cached is not None:
+            page = request_page(make_url(word), cached.etag, cached.last_modified)
+        else:
+            page = request_page(make_url(word))
+    except HostUnavailable:
+        raise
+    except DictionaryUnavailable as e:
+        RECENT_FAILURES.add(dictionary, word, str(e))
+        raise
+
+    if page is not None and page.html is not None and conf.DICTIONARY_ARCHIVE_RAW:
+        get_raw_archive(dictionary).put(word, page.html)
+
+    return page
+
+
+def extract_html(dictionary: str, word, language_id, html: str) -> str:
+    _, extract = DICTIONARIES[dictionary]
+    return extract(parse_html(html), word, language_id)
+
+
+def is_stale(dictionary: str, entry: CacheEntry, now: float) -> bool:
+    """
+    Check if the cache entry is older than the max age configured for the dictionary, words the dictionary didn't
+    have are checked again sooner
+    """
+    max_age_days = conf.DICTIONARY_MAX_AGE_DAYS.get(dictionary)
+    if entry.contents == NO_RESULTS:
+        not_found_days = conf.DICTIONARY_NOT_FOUND_MAX_AGE_DAYS
+        max_age_days = not_found_days if max_age_days is None else min(max_age_days, not_found_days)
+    if max_age_days is None:
+        return False
+    if entry.fetched_at is None:
+        return True
+    return now - entry.fetched_at > max_age_days * 24 * 60 * 60
+
+
+def lookup_entry(dictionary: str, word, language_id, cached: Optional[CacheEntry] = None) -> CacheEntry:
+    """
+    Fetch the dictionary page for the word and extract the definition text. When revalidating a cached entry
+    that hasn't changed, the page isn't parsed at all.
+
+    Raises DictionaryUnavailable if the dictionary can't be reached, so the failure isn't cached as a definition.
+    """
+    page = fetch_raw(dictionary, word, cached)
+    now = time.time()
+
+    if page is None:
+        return CacheEntry(NO_RESULTS, fetched_at=now)
+
+    if page.not_modified:
+        return replace(cached, fetched_at=now)
+
+    text = extract_html(dictionary, word, language_id, page.html)
+    return CacheEntry(text, page.etag, page.last_modified, now)
+
+
+def lookup(dictionary: str, word, language_id) -> str:
+    """
+    Fetch the dictionary page for the word and extract the definition text
+    """
+    return lookup_entry(dictionary, word, language_id).contents
+
+
 LANGUAGE_DICTS = {
     "fi": [wiktionary],
     "et": [ekss, wiktionary],
 }
 
 
+def find_cached_lemmas(words: list[str], language_id) -> dict[str, str]:
+    """
+    The lemmas of the words whose definitions are all cached, without any network access. Words none of the
+    dictionaries know a lemma for are their own lemma.
+    """
+    dictionaries = [dict_func.__name__ for dict_func in LANGUAGE_DICTS[language_id]]
+    entries = {dictionary: get_cache().get_entries(language_id, dictionary, words) for dictionary in dictionaries}
+
+    lemmas = {}
+    for word in words:
+        if all(word in entries[dictionary] for dictionary in dictionaries):
+            definitions = {dictionary: entries[dictionary][word].contents for dictionary in dictionaries}
+            lemmas[word] = find_lemma(word, definitions) or word
+    return lemmas
+
+
+def get_definition(word, language_id, dict_func) -> str:
+    """
+    Get the definition of the word from a single dictionary, from cache if possible
+    """
+    dict_name = dict_func.__name__
+    answer = get_word_cache(word, language_id, dict_name)
+    if answer is None:
+        if dict_name in DICTIONARIES:
+            # Keeps the response validators for refreshing the entry later
+            entry = lookup_entry(dict_name, word, language_id)
+        else:
+            entry = CacheEntry(dict_func(word, language_id), fetched_at=time.time())
+
+        get_cache().put_entries(language_id, dict_name, {word: entry})
+        answer = share_text(entry.contents)
+    return answer
+
+
+def find_lemma(word, definitions: dict[str, str]) -> Optional[str]:
+    """
+    The lemma of the word according to the first dictionary that knows it, None if none of them do
+    """
+    for dictionary, text in definitions.items():
+        find = LEMMA_FINDERS.get(dictionary)
+        if find is None or text == NO_RESULTS:
+            continue
+        lemma = find(word, text)
+        if lemma:
+            return lemma
+    return None
+
+
+def shared_article(dictionary: str, text: str) -> str:
+    """
+    The definition text without the parts specific to the looked up form, equal for forms that got the same article
+    """
+    clean = ARTICLE_CLEANERS.get(dictionary)
+    return clean(text) if clean else text
+
+
 def get_word_definitions(word, language_id) -> dict[str, str]:
     """
     Find data from all the available dictionaries for the word, using local caching when possible to avoid
-    unnecessary traffic on their servers.
+    unnecessary traffic on their servers. Identical definitions of different words are the same string object.
     """
     result = {}
     dictionaries = LANGUAGE_DICTS[language_id]
 
     for dict_func in dictionaries:
-        dict_name = dict_func.__name__
-        answer = get_word_cache(word, language_id, dict_name)
-        if answer is None:
-            answer = dict_func(word, language_id)
-            if answer is None:
-                raise Exception(f"Failed to get {language_id} dictionary definition for {word} from {dict_name}")
-            cache_word(word, language_id, dict_name, answer)
-        result[dict_name] = answer
+        result[dict_func.__name__] = get_definition(word, language_id, dict_func)
 
     manual = manual_information(word, language_id)
     if manual:
@@ -0,0 +1,164 @@
+import sys
+from pathlib import Path
+from time import perf_counter
+
+from bs4 import BeautifulSoup, NavigableString, Tag
+from rich import print
+
+from data_processing.dictionary import (
+    HTML_PARSER,
+    ekss_extract,
+    html_to_text,
+    wiktionary_extract,
+)
+
+# Fixture files are named <dictionary>_<word>.html
+EXTRACTORS = {
+    "ekss": ekss_extract,
+    "wiktionary": wiktionary_extract,
+}
+
+
+def html_to_text_reference(content):
+    """
+    The original html_to_text, which checks every parent of every string for visibility
+    """
+    text = []
+    for element in content.descendants:
+        if type(element) is NavigableString:
+            parent_tags = (t for t in element.parents if type(t) is Tag)
+            hidden = False
+            for parent_tag in parent_tags:
+                if (parent_tag.name in ('area', 'base', 'basefont', 'datalist', 'head', 'link',
+                                        'meta', 'noembed', 'noframes', 'param', 'rp', 'script',
+                                        'source', 'style', 'template', 'track', 'title', 'noscript') or
+                    parent_tag.has_attr('hidden') or
+                    (parent_tag.name == 'input' and parent_tag.get('type') == 'hidden')):
+                    hidden = True
+                    break
+            if hidden:
+                continue
+
+            string = ' '.join(element.string.split())
+            if string:
+                if element.parent.name == 'a':
+                    a_tag = element.parent
+                    string = a_tag['href']
+                    if (type(a_tag.previous_sibling) is NavigableString and
+                        a_tag.previous_sibling.string.strip()):
+                        text[-1] = text[-1] + ' ' + string
+                        continue
+                elif element.previous_sibling and element.previous_sibling.name == 'a':
+                    text[-1] = text[-1] + ' ' + string
+                    continue
+                elif element.parent.name == 'p':
+                    string = '\n' + string
+                text += [string]
+    doc = '\n'.join(text)
+    return doc
+
+
+def _html_files(paths: list[str]) -> list[Path]:
+    files = []
+    for path in map(Path, paths):
+        if path.is_dir():
+            files.extend(sorted(path.glob("*.html")))
+        else:
+            files.append(path)
+    return files
+
+
+def _time(func, soup, rounds: int) -> tuple[float, str]:
+    start = perf_counter()
+    for _ in range(rounds):
+        result = func(soup)
+    return (perf_counter() - start) / rounds, result
+
+
+def compare_parsers(files: list[Path], language_id: str):
+    """
+    Check the dictionaries extract the same text with the configured parser as with html.parser
+    """
+    parse_times = {"html.parser": 0.0, HTML_PARSER: 0.0}
+    mismatches = 0
+
+    for path in files:
+        dictionary, _, word = path.stem.partition("_")
+        extract = EXTRACTORS.get(dictionary)
+        if extract is None:
+            print(f"Skipping {path.name}, no dictionary named {dictionary}")
+            continue
+
+        html = path.read_text(encoding="utf-8")
+        texts = {}
+        for parser in parse_times:
+            start = perf_counter()
+            soup = BeautifulSoup(html, parser)
+            parse_times[parser] += perf_counter() - start
+            texts[parser] = extract(soup, word, language_id)
+
+        if len(set(texts.values())) > 1:
+            mismatches += 1
+            print(f"[red]{path}: {HTML_PARSER} extracts different text than html.parser[/red]")
+
+    pages = max(len(files), 1)
+    timings = ", ".join(f"{parser} {seconds / pages * 1000:.2f}ms" for parser, seconds in parse_times.items())
+    print(f"{len(files):,} pages, {mismatches:,} mismatches, parse time per page: {timings}")
+
+
+def main():
+    """
+    Compare html_to_text against the original implementation on saved HTML pages, or with --parsers the
+    text extracted with the configured parser against html.parser
+
+    Usage: python -m data_processing.dictionary_bench [--rounds N] [--parsers] [--language et] <file.html | directory> ...
+    """
+    args = sys.argv[1:]
+    rounds = 5
+    language_id = "et"
+    if "--rounds" in args:
+        rounds_idx = args.index("--rounds")
+        rounds = int(args[rounds_idx + 1])
+        del args[rounds_idx:rounds_idx + 2]
+
+    if "--language" in args:
+        language_idx = args.index("--language")
+        language_id = args[language_idx + 1]
+        del args[language_idx:language_idx + 2]
+
+    if "--parsers" in args:
+        args.remove("--parsers")
+        compare_parsers(_html_files(args), language_id)
+        return
+
+    total_reference = 0.0
+    total_current = 0.0
+    mismatches = 0
+    files = _html_files(args)
+
+    for path in files:
+        soup = BeautifulSoup(path.read_text(encoding="utf-8"), "html.parser")
+        reference_time, reference = _time(html_to_text_reference, soup, rounds)
+        current_time, current = _time(html_to_text, soup, rounds)
+        total_reference += reference_time
+        total_current += current_time
+
+        if current != reference:
+            mismatches += 1
+            print(f"[red]{path}: output differs from the reference[/red]")
+
+        print(f"{path.name:<40} {reference_time * 1000:8.2f}ms -> {current_time * 1000:8.2f}ms")
+
+    if not files:
+        print("No HTML files given.")
+        return
+
+    speedup = total_reference / max(total_current, 1e-9)
+    print(
+        f"{len(files):,} pages, {mismatches:,} mismatches, "
+        f"{total_reference * 1000:.1f}ms -> {total_current * 1000:.1f}ms ({speedup:.1f}x faster)"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,45 @@
+import pytest
+import requests
+
+from data_processing import dictionary
+from data_processing.dictionary import NO_RESULTS, UnexpectedResponse, lookup_entry
+
+
+def _response(status_code: int, content_type: str = "text/html; charset=utf-8", body: str = "") -> requests.Response:
+    response = requests.Response()
+    response.status_code = status_code
+    response.headers["content-type"] = content_type
+    response._content = body.encode("utf-8")
+    return response
+
+
+@pytest.fixture
+def respond(monkeypatch):
+    responses = []
+
+    def get(url, headers=None, timeout=None):
+        return responses.pop(0)
+
+    monkeypatch.setattr(dictionary.SESSION, "get", get)
+    monkeypatch.setattr(dictionary.RATE_LIMITER, "wait", lambda url: None)
+    monkeypatch.setattr(dictionary, "RECENT_FAILURES", dictionary.RecentFailures(0))
+    return responses.append
+
+
+@pytest.mark.parametrize("status_code", [404, 410])
+def test_missing_page_is_negative_result(respond, status_code: int):
+    respond(_response(status_code))
+    assert lookup_entry("wiktionary", "qwerty", "et").contents == NO_RESULTS
+
+
+@pytest.mark.parametrize("status_code", [400, 401, 403, 451])
+def test_other_errors_are_not_negative_results(respond, status_code: int):
+    respond(_response(status_code))
+    with pytest.raises(UnexpectedResponse):
+        lookup_entry("wiktionary", "aasta", "et")
+
+
+def test_non_html_page_is_not_negative_result(respond):
+    respond(_response(200, "application/json", "{}"))
+    with pytest.raises(UnexpectedResponse):
+        lookup_entry("wiktionary", "aasta", "et")
@@ -0,0 +1,54 @@
+from pathlib import Path
+
+from data_processing.dictionary import parse_html, wiktionary_extract, wiktionary_lemma
+
+FIXTURES = Path(__file__).parent / "fixtures"
+
+
+def _wiktionary(word: str, language_id: str) -> str:
+    html = (FIXTURES / f"wiktionary_{word}.html").read_text(encoding="utf-8")
+    return wiktionary_extract(parse_html(html), word, language_id)
+
+
+def test_lemma_of_form():
+    assert wiktionary_lemma("vuodet", _wiktionary("vuodet", "fi")) == "vuosi"
+
+
+def test_lemma_with_own_table():
+    assert wiktionary_lemma("aasta", _wiktionary("aasta", "et")) == "aasta"
+
+
+def test_homograph_has_no_lemma():
+    # A pronoun with its own declension table, and a form of "kukka"
+    assert wiktionary_lemma("kukin", _wiktionary("kukin", "fi")) is None
+
+
+def test_homograph_with_table_of_other_lemma_has_no_lemma():
+    text = (
+        "Finnish\nEtymology 1\nAdverb\nalas\ndown, downward\nInflection\nDeclension of\nala-\nnoun case\n"
+        "Etymology 2\nVerb\nalas\nsecond-person singular present imperative of\nalkaa\n"
+    )
+    assert wiktionary_lemma("alas", text) is None
+
+
+def test_form_with_own_meaning_has_no_lemma():
+    text = "Finnish\nPronoun\nne\nnominative plural of\nse\n: they, those\nnominative plural of\nse\n: they\n"
+    assert wiktionary_lemma("ne", text) is None
+
+
+def test_forms_list_is_not_own_meaning():
+    text = "Estonian\nNoun\nmaad\ninflection of\nmaa\n:\npartitive singular\nnominative plural\n"
+    assert wiktionary_lemma("maad", text) == "maa"
+
+
+def test_word_with_own_part_of_speech_has_no_lemma():
+    text = (
+        "Estonian\nAdjective\nkiirelt\nablative singular of\nkiire\nAdverb\nkiirelt\n(\ncomparative\nkiiremalt\n"
+        ")\nquickly\n"
+    )
+    assert wiktionary_lemma("kiirelt", text) is None
+
+
+def test_example_sentences_are_not_sections():
+    text = "Finnish\nVerb\non\nthird-person singular indicative present of\nolla\nSe\non\ntuolla.\nit is there.\n"
+    assert wiktionary_lemma("on", text) == "olla"
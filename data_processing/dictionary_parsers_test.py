@@ -0,0 +1,76 @@
+from pathlib import Path
+from typing import Optional
+
+import pytest
+
+from data_processing.dictionary import NO_RESULTS, ekss_lemma, parse_html
+from data_processing.dictionary_bench import EXTRACTORS
+
+# Pages named <dictionary>_<word>.html, the ones with a stored definition must extract to it
+FIXTURES = sorted((Path(__file__).parent / "fixtures").glob("*.html"))
+DEFINITIONS = Path(__file__).parent / "languages"
+FIXTURE_LANGUAGES = {
+    "kukin": "fi",
+    "vuodet": "fi",
+}
+
+
+def _stored(path: Path) -> Path:
+    dictionary, _, word = path.stem.partition("_")
+    return DEFINITIONS / FIXTURE_LANGUAGES.get(word, "et") / dictionary / f"{word}.txt"
+
+
+def _extract(path: Path, parser: str, html: Optional[str] = None) -> str:
+    dictionary, _, word = path.stem.partition("_")
+    if html is None:
+        html = path.read_text(encoding="utf-8")
+    return EXTRACTORS[dictionary](parse_html(html, parser), word, FIXTURE_LANGUAGES.get(word, "et"))
+
+
+@pytest.mark.parametrize("path", FIXTURES, ids=lambda path: path.stem)
+def test_lxml_extracts_same_text_as_html_parser(path: Path):
+    assert _extract(path, "lxml") == _extract(path, "html.parser")
+
+
+@pytest.mark.parametrize("path", [path for path in FIXTURES if _stored(path).exists()], ids=lambda path: path.stem)
+@pytest.mark.parametrize("parser", ["html.parser", "lxml"])
+def test_extracts_stored_definition(path: Path, parser: str):
+    assert _extract(path, parser) == _stored(path).read_text(encoding="utf-8")
+
+
+@pytest.mark.parametrize("parser", ["html.parser", "lxml"])
+def test_ekss_keeps_replaced_word_note(parser: str):
+    path = Path(__file__).parent / "fixtures" / "ekss_aastad.html"
+    text = _extract(path, parser)
+    assert text.lstrip().startswith("Asendasin 'aastad' sõnaga 'aasta'\n")
+    assert ekss_lemma("aastad", text) == "aasta"
+
+    # html.parser nests the article in a <p> that isn't closed, the note used to be lost then
+    unclosed = path.read_text(encoding="utf-8").replace("</p>\n<div class=\"tervikart\">", "\n<div class=\"tervikart\">")
+    assert _extract(path, parser, unclosed) == text
+
+
+@pytest.mark.parametrize("parser", ["html.parser", "lxml"])
+def test_ekss_article_mentioning_word_is_not_its_lemma(parser: str):
+    text = _extract(Path(__file__).parent / "fixtures" / "ekss_aastaid.html", parser)
+    assert text.startswith("aastane\n")
+    assert ekss_lemma("aastaid", text) is None
+
+
+@pytest.mark.parametrize("parser", ["html.parser", "lxml"])
+def test_wiktionary_drops_other_languages_and_trailing_sections(parser: str):
+    text = _extract(Path(__file__).parent / "fixtures" / "wiktionary_aasta.html", parser)
+    assert text.startswith("Estonian\n")
+    # The Finnish section is a form of "aasi"
+    assert "aasi" not in text
+    assert "Further reading" not in text
+    assert "Anagrams" not in text
+    assert "edit" not in text
+    assert "client-js" not in text
+
+
+@pytest.mark.parametrize("parser", ["html.parser", "lxml"])
+def test_missing_articles(parser: str):
+    fixtures = Path(__file__).parent / "fixtures"
+    assert _extract(fixtures / "ekss_qwerty.html", parser) == NO_RESULTS
+    assert _extract(fixtures / "wiktionary_qwerty.html", parser) == NO_RESULTS
@@ -1,3 +1,3 @@
-from data_processing.dictionary import get_word_definitions, ekss, wiktionary
+from data_processing.dictionary import wiktionary
 
 print(wiktionary("ala", "et"))
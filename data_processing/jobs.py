@@ -0,0 +1,342 @@
+import os
+import socket
+import sqlite3
+import time
+from itertools import islice
+from typing import Callable, Iterable, Iterator, Optional
+
+from data_processing.cache import SqliteDatabase
+from data_processing.settings import LANGUAGES_SRC, conf
+from data_processing.words import WordSource
+
+PENDING = "pending"
+GENERATED = "generated"
+FAILED = "failed"
+NEEDS_REGENERATION = "needs_regeneration"
+
+# Words ai_generate works on by default
+TODO_STATES = (PENDING, NEEDS_REGENERATION)
+ALL_STATES = (PENDING, NEEDS_REGENERATION, GENERATED, FAILED)
+
+SYNC_BATCH = 1000
+
+
+class JobLedger(SqliteDatabase):
+    """
+    The generation state of every word of a language, in languages/<language>/jobs.sqlite3
+
+    Words are handed out in word list order from an index on (state, rank), so a resumed run continues from the
+    first unfinished word without going through the finished ones.
+
+    Several workers, in one or more processes, can share the ledger. Each claim is a single transaction, so a word
+    is never handed out twice, and holds a lease on the word until it's finished. A worker releases the words it
+    didn't finish when it stops, the lease of a crashed worker expires, or is released as soon as another worker on
+    the same host sees its process is gone, and the word is handed out again.
+
+    Words can be grouped by their lemma, so the forms of a word are handed out together.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS jobs (
+            word TEXT PRIMARY KEY,
+            -- Position in the word list, NULL once the word is no longer in it
+            rank INTEGER,
+            state TEXT NOT NULL,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            started_at REAL,
+            finished_at REAL,
+            -- Total time spent generating over all the attempts
+            seconds REAL NOT NULL DEFAULT 0,
+            error TEXT,
+            claimed_by TEXT,
+            lease_until REAL,
+            -- When a worker last finished with the word, it's not handed out again to workers started before
+            visited_at REAL,
+            -- Base form of the word, the word itself if it has no other forms, NULL until grouped
+            lemma TEXT
+        );
+        CREATE INDEX IF NOT EXISTS jobs_state_rank ON jobs (state, rank);
+        CREATE TABLE IF NOT EXISTS meta (
+            key TEXT PRIMARY KEY,
+            value TEXT NOT NULL
+        );
+    """
+
+    def __init__(self, language_id: str):
+        super().__init__(LANGUAGES_SRC / language_id / "jobs.sqlite3")
+        self.language_id = language_id
+
+    def _upgrade(self, connection: sqlite3.Connection):
+        columns = {row[1] for row in connection.execute("PRAGMA table_info(jobs)")}
+        for column, column_type in (
+            ("claimed_by", "TEXT"),
+            ("lease_until", "REAL"),
+            ("visited_at", "REAL"),
+            ("lemma", "TEXT"),
+        ):
+            if column not in columns:
+                connection.execute(f"ALTER TABLE jobs ADD COLUMN {column} {column_type}")
+        connection.execute("CREATE INDEX IF NOT EXISTS jobs_lemma ON jobs (lemma)")
+
+    def sync(self, source: WordSource, is_generated: Callable[[str], bool]) -> int:
+        """
+        Bring the ledger up to date with the word list, new words start as generated if they already have a
+        result. Does nothing if the word list hasn't changed since the last sync. Returns the number of new words.
+        """
+        stat = source.path.stat()
+        version = f"{stat.st_size}:{stat.st_mtime_ns}"
+
+        with self.lock:
+            connection = self._connect()
+            row = connection.execute("SELECT value FROM meta WHERE key = 'source'").fetchone()
+            if row is not None and row[0] == version:
+                return 0
+
+            with connection:
+                before = connection.execute("SELECT COUNT(*) FROM jobs").fetchone()[0]
+                connection.execute("UPDATE jobs SET rank = NULL")
+                ranked = enumerate(source)
+                while batch := list(islice(ranked, SYNC_BATCH)):
+                    connection.executemany(
+                        "INSERT INTO jobs (word, rank, state) VALUES (?, ?, ?) "
+                        "ON CONFLICT (word) DO UPDATE SET rank = excluded.rank",
+                        (
+                            (word, rank, GENERATED if is_generated(word) else PENDING)
+                            for rank, word in batch
+                        ),
+                    )
+                after = connection.execute("SELECT COUNT(*) FROM jobs").fetchone()[0]
+                connection.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('source', ?)", (version,))
+        return after - before
+
+    def claim_group(self, worker: str, states: tuple[str, ...], since: float, after_rank: int = -1,
+                    max_words: int = 1) -> list[tuple[int, str, str]]:
+        """
+        Claim the first word after `after_rank` in the given states that isn't leased to another worker and hasn't
+        been finished since `since`, along with up to `max_words` - 1 other words with the same lemma under the same
+        conditions. Returns the rank, word and state of each in word list order, an empty list if there's nothing
+        to claim.
+        """
+        now = time.time()
+        lease_until = now + conf.AI_WORKER_LEASE_SECONDS
+        placeholders = ", ".join("?" * len(states))
+        available = (
+            f"state IN ({placeholders}) AND (lease_until IS NULL OR lease_until < ?) "
+            "AND (visited_at IS NULL OR visited_at < ?)"
+        )
+        with self.lock:
+            connection = self._connect()
+            with connection:
+                first = connection.execute(
+                    "UPDATE jobs SET claimed_by = ?, lease_until = ? WHERE word = ("
+                    f"  SELECT word FROM jobs WHERE {available} AND rank > ? ORDER BY rank LIMIT 1"  # nosec: B608
+                    ") RETURNING rank, word, state, lemma",
+                    (worker, lease_until, *states, now, since, after_rank),
+                ).fetchone()
+                if first is None:
+                    return []
+
+                rank, word, state, lemma = first
+                claimed = [(rank, word, state)]
+                if lemma is not None and max_words > 1:
+                    claimed += connection.execute(
+                        "UPDATE jobs SET claimed_by = ?, lease_until = ? WHERE word IN ("
+                        f"  SELECT word FROM jobs WHERE lemma = ? AND word != ? AND {available} "  # nosec: B608
+                        "   AND rank IS NOT NULL ORDER BY rank LIMIT ?"
+                        ") RETURNING rank, word, state",
+                        (worker, lease_until, lemma, word, *states, now, since, max_words - 1),
+                    ).fetchall()
+        return sorted(claimed)
+
+    def claim_groups(self, states: tuple[str, ...] = TODO_STATES, worker: Optional[str] = None,
+                     max_words: int = 1) -> Iterator[list[tuple[str, str]]]:
+        """
+        Claim the words in the given states in word list order, each with up to `max_words` - 1 other forms of the
+        same lemma, yields the words of each group with their state. The iterator can be shared by the workers of
+        one process.
+        """
+        worker = worker or default_worker_id()
+        self.release_dead()
+        since = time.time()
+        after_rank = -1
+        while True:
+            claimed = self.claim_group(worker, states, since, after_rank, max_words)
+            if not claimed and after_rank >= 0:
+                # Look for words behind us whose lease expired
+                after_rank = -1
+                claimed = self.claim_group(worker, states, since, after_rank, max_words)
+            if not claimed:
+                return
+            # Continue after the first word of the group, its other forms can be anywhere in the list
+            after_rank = min(rank for rank, _, _ in claimed if rank > after_rank)
+            yield [(word, state) for _, word, state in claimed]
+
+    def claim_words(self, states: tuple[str, ...] = TODO_STATES, worker: Optional[str] = None) -> Iterator[
+        tuple[str, str]
+    ]:
+        """
+        Claim the words in the given states one at a time in word list order, yields each word with its state.
+        The iterator can be shared by the workers of one process.
+        """
+        for group in self.claim_groups(states, worker):
+            yield from group
+
+    def group(self, find_lemmas: Callable[[list[str]], dict[str, str]], version: str = "") -> int:
+        """
+        Set the lemma of the words in the word list that don't have one yet. `find_lemmas` returns the lemmas it
+        could find for a batch of words, the other words are tried again on the next call. The lemmas found by
+        another `version` of `find_lemmas` are found again. Returns the number of words grouped.
+        """
+        with self.lock:
+            connection = self._connect()
+            row = connection.execute("SELECT value FROM meta WHERE key = 'lemmas'").fetchone()
+            if row is None or row[0] != version:
+                with connection:
+                    connection.execute("UPDATE jobs SET lemma = NULL")
+                    connection.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('lemmas', ?)", (version,))
+
+        grouped = 0
+        after_rank = -1
+        while True:
+            with self.lock:
+                rows = self._connect().execute(
+                    "SELECT rank, word FROM jobs WHERE lemma IS NULL AND rank > ? ORDER BY rank LIMIT ?",
+                    (after_rank, SYNC_BATCH),
+                ).fetchall()
+            if not rows:
+                return grouped
+
+            after_rank = rows[-1][0]
+            lemmas = find_lemmas([word for _, word in rows])
+            with self.lock:
+                connection = self._connect()
+                with connection:
+                    connection.executemany(
+                        "UPDATE jobs SET lemma = ? WHERE word = ?",
+                        ((lemma, word) for word, lemma in lemmas.items()),
+                    )
+            grouped += len(lemmas)
+
+    def release(self, worker: Optional[str] = None) -> int:
+        """
+        Release the words claimed by the worker that it didn't finish, e.g. when it's interrupted, so a restarted
+        worker gets them straight away. Returns the number of words released.
+        """
+        worker = worker or default_worker_id()
+        with self.lock:
+            connection = self._connect()
+            with connection:
+                cursor = connection.execute(
+                    "UPDATE jobs SET claimed_by = NULL, lease_until = NULL WHERE claimed_by = ?",
+                    (worker,),
+                )
+        return cursor.rowcount
+
+    def release_dead(self) -> int:
+        """
+        Release the leases held by workers on this host whose process is gone, returns the number of words released
+        """
+        with self.lock:
+            workers = [
+                row[0] for row in self._connect().execute(
+                    "SELECT DISTINCT claimed_by FROM jobs WHERE claimed_by IS NOT NULL AND lease_until >= ?",
+                    (time.time(),),
+                )
+            ]
+        return sum(self.release(worker) for worker in workers if not is_worker_alive(worker))
+
+    def count(self, states: Iterable[str] = ALL_STATES) -> dict[str, int]:
+        states = tuple(states)
+        placeholders = ", ".join("?" * len(states))
+        with self.lock:
+            rows = self._connect().execute(
+                f"SELECT state, COUNT(*) FROM jobs WHERE state IN ({placeholders}) "  # nosec: B608
+                "AND rank IS NOT NULL GROUP BY state",
+                states,
+            )
+            result = dict.fromkeys(states, 0)
+            result.update(rows)
+        return result
+
+    def start(self, word: str):
+        """
+        Record the start of a generation attempt and renew the lease, the word keeps its state until it's finished
+        """
+        now = time.time()
+        with self.lock:
+            connection = self._connect()
+            with connection:
+                connection.execute(
+                    "UPDATE jobs SET attempts = attempts + 1, started_at = ?, lease_until = ? WHERE word = ?",
+                    (now, now + conf.AI_WORKER_LEASE_SECONDS, word),
+                )
+
+    def finish(self, word: str, state: str, seconds: float = 0.0, error: Optional[str] = None):
+        """
+        Record the outcome and release the claim on the word
+        """
+        now = time.time()
+        with self.lock:
+            connection = self._connect()
+            with connection:
+                connection.execute(
+                    "UPDATE jobs SET state = ?, finished_at = ?, visited_at = ?, seconds = seconds + ?, error = ?, "
+                    "claimed_by = NULL, lease_until = NULL WHERE word = ?",
+                    (state, now, now, seconds, error, word),
+                )
+
+    def set_state(self, word: str, state: str):
+        with self.lock:
+            connection = self._connect()
+            with connection:
+                connection.execute("UPDATE jobs SET state = ? WHERE word = ?", (state, word))
+
+    def reset(self, states: tuple[str, ...], state: str) -> int:
+        """
+        Move all the words in the given states to another state, returns the number of words moved
+        """
+        placeholders = ", ".join("?" * len(states))
+        with self.lock:
+            connection = self._connect()
+            with connection:
+                cursor = connection.execute(
+                    f"UPDATE jobs SET state = ? WHERE state IN ({placeholders})",  # nosec: B608
+                    (state, *states),
+                )
+        return cursor.rowcount
+
+    def summary(self) -> str:
+        counts = self.count()
+        return f"{self.language_id} words: " + ", ".join(
+            f"{count:,} {state.replace('_', ' ')}" for state, count in counts.items()
+        ) + "."
+
+
+def default_worker_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def is_worker_alive(worker: str) -> bool:
+    """
+    False if the worker ran on this host and its process is gone, workers on other hosts are assumed to be alive
+    """
+    host, _, pid = worker.rpartition(":")
+    if host != socket.gethostname() or not pid.isdigit():
+        return True
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        # Another user's process
+        return True
+    return True
+
+
+_ledgers: dict[str, JobLedger] = {}
+
+
+def get_job_ledger(language_id: str) -> JobLedger:
+    if language_id not in _ledgers:
+        _ledgers[language_id] = JobLedger(language_id)
+    return _ledgers[language_id]
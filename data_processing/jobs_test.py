@@ -0,0 +1,194 @@
+import multiprocessing
+import os
+import socket
+import time
+from pathlib import Path
+
+import pytest
+
+from data_processing import jobs
+from data_processing.jobs import (
+    FAILED,
+    GENERATED,
+    NEEDS_REGENERATION,
+    PENDING,
+    TODO_STATES,
+    JobLedger,
+)
+from data_processing.words import WordSource
+
+
+@pytest.fixture
+def ledger(tmp_path, monkeypatch) -> JobLedger:
+    monkeypatch.setattr(jobs, "LANGUAGES_SRC", tmp_path)
+    return JobLedger("fi")
+
+
+def _add(ledger: JobLedger, *words: str):
+    with ledger.lock:
+        connection = ledger._connect()
+        with connection:
+            connection.executemany(
+                "INSERT INTO jobs (word, rank, state) VALUES (?, ?, ?)",
+                ((word, rank, PENDING) for rank, word in enumerate(words)),
+            )
+
+
+def _lemmas(ledger: JobLedger) -> dict[str, str]:
+    return dict(ledger._connect().execute("SELECT word, lemma FROM jobs"))
+
+
+def test_group_keeps_lemmas_of_same_version(ledger: JobLedger):
+    _add(ledger, "kukin", "vuodet")
+    assert ledger.group(lambda words: {word: "kukka" for word in words}, "1") == 2
+    assert ledger.group(lambda words: {word: "kukka" for word in words}, "1") == 0
+
+
+def test_group_finds_lemmas_again_with_new_version(ledger: JobLedger):
+    _add(ledger, "kukin", "vuodet")
+    ledger.group(lambda words: {word: "kukka" for word in words}, "1")
+    assert ledger.group(lambda words: {"vuodet": "vuosi"}, "2") == 1
+    assert _lemmas(ledger) == {"kukin": None, "vuodet": "vuosi"}
+
+
+def _source(tmp_path, *words: str) -> WordSource:
+    path = tmp_path / "words.txt"
+    path.write_text("".join(f"{word}\n" for word in words), encoding="utf-8")
+    return WordSource(path)
+
+
+def _states(ledger: JobLedger) -> dict[str, str]:
+    return dict(ledger._connect().execute("SELECT word, state FROM jobs WHERE rank IS NOT NULL"))
+
+
+def test_sync_adds_new_words(ledger: JobLedger, tmp_path):
+    source = _source(tmp_path, "aika", "vuosi")
+    assert ledger.sync(source, lambda word: word == "vuosi") == 2
+    assert _states(ledger) == {"aika": PENDING, "vuosi": GENERATED}
+
+    # The word list hasn't changed
+    assert ledger.sync(source, lambda word: False) == 0
+
+    source = _source(tmp_path, "vuosi", "päivä")
+    os.utime(source.path, ns=(0, 0))
+    assert ledger.sync(source, lambda word: False) == 1
+    assert _states(ledger) == {"vuosi": GENERATED, "päivä": PENDING}
+    assert ledger.count() == {PENDING: 1, NEEDS_REGENERATION: 0, GENERATED: 1, FAILED: 0}
+
+
+def test_finish_and_reset(ledger: JobLedger, tmp_path):
+    ledger.sync(_source(tmp_path, "aika", "vuosi", "päivä"), lambda word: False)
+    ledger.start("aika")
+    ledger.finish("aika", FAILED, 1.5, "no answer")
+    ledger.start("aika")
+    ledger.finish("aika", FAILED, 0.5, "no answer")
+    ledger.finish("vuosi", GENERATED)
+
+    attempts, seconds, error = ledger._connect().execute(
+        "SELECT attempts, seconds, error FROM jobs WHERE word = 'aika'"
+    ).fetchone()
+    assert (attempts, seconds, error) == (2, 2.0, "no answer")
+
+    assert ledger.reset((FAILED, GENERATED), NEEDS_REGENERATION) == 2
+    assert _states(ledger) == {"aika": NEEDS_REGENERATION, "vuosi": NEEDS_REGENERATION, "päivä": PENDING}
+
+
+def test_claims_hand_out_each_word_once(ledger: JobLedger, tmp_path):
+    ledger.sync(_source(tmp_path, "aika", "vuosi", "päivä"), lambda word: word == "vuosi")
+    first = ledger.claim_words(worker="host:1")
+    second = ledger.claim_words(worker="host:2")
+    assert next(first) == ("aika", PENDING)
+    assert next(second) == ("päivä", PENDING)
+    assert next(first, None) is None
+    assert next(second, None) is None
+
+
+def test_expired_lease_is_claimed_again(ledger: JobLedger, tmp_path):
+    ledger.sync(_source(tmp_path, "aika", "vuosi"), lambda word: False)
+    assert next(ledger.claim_words(worker="host:1")) == ("aika", PENDING)
+    assert next(ledger.claim_words(worker="host:2")) == ("vuosi", PENDING)
+    assert next(ledger.claim_words(worker="host:3"), None) is None
+
+    connection = ledger._connect()
+    with connection:
+        connection.execute("UPDATE jobs SET lease_until = ? WHERE word = 'aika'", (time.time() - 1,))
+    assert list(ledger.claim_words(worker="host:3")) == [("aika", PENDING)]
+
+
+def test_finished_word_is_not_claimed_again_by_running_worker(ledger: JobLedger, tmp_path, monkeypatch):
+    ledger.sync(_source(tmp_path, "aika"), lambda word: False)
+    monkeypatch.setattr(jobs.conf, "AI_WORKER_LEASE_SECONDS", -1.0)
+    running = ledger.claim_words(worker="host:1")
+    assert next(running) == ("aika", PENDING)
+    # Put back in the queue, e.g. because the dictionary was unavailable
+    ledger.finish("aika", PENDING)
+    assert next(running, None) is None
+    assert next(ledger.claim_words(worker="host:2")) == ("aika", PENDING)
+
+
+def test_release_frees_unfinished_words(ledger: JobLedger, tmp_path):
+    ledger.sync(_source(tmp_path, "aika", "vuosi"), lambda word: False)
+    claims = ledger.claim_words(worker="host:1")
+    next(claims)
+    next(claims)
+    ledger.finish("aika", GENERATED)
+    assert ledger.release("host:1") == 1
+    assert list(ledger.claim_words(worker="host:2")) == [("vuosi", PENDING)]
+
+
+def test_leases_of_dead_workers_are_released(ledger: JobLedger, tmp_path):
+    ledger.sync(_source(tmp_path, "aika", "vuosi", "päivä"), lambda word: False)
+    pid = os.fork()
+    if pid == 0:
+        os._exit(0)
+    os.waitpid(pid, 0)
+    since = time.time()
+    ledger.claim_group(f"{socket.gethostname()}:{pid}", TODO_STATES, since)
+    ledger.claim_group(f"{socket.gethostname()}:{os.getpid()}", TODO_STATES, since)
+    ledger.claim_group("elsewhere:1", TODO_STATES, since)
+
+    assert ledger.release_dead() == 1
+    assert list(ledger.claim_words(worker="host:2")) == [("aika", PENDING)]
+
+
+def test_claim_groups_forms_of_lemma(ledger: JobLedger, tmp_path):
+    ledger.sync(_source(tmp_path, "vuodet", "aika", "vuosi", "vuotta"), lambda word: False)
+    ledger.group(lambda words: {word: "vuosi" for word in words if word.startswith("vuo")}, "1")
+    groups = list(ledger.claim_groups(worker="host:1", max_words=2))
+    assert groups == [
+        [("vuodet", PENDING), ("vuosi", PENDING)],
+        [("aika", PENDING)],
+        [("vuotta", PENDING)],
+    ]
+
+
+def _generate(languages_src: Path, start, results):
+    jobs.LANGUAGES_SRC = languages_src
+    ledger = JobLedger("fi")
+    start.wait()
+    claimed = []
+    for word, _ in ledger.claim_words():
+        claimed.append(word)
+        ledger.start(word)
+        time.sleep(0.001)
+        ledger.finish(word, GENERATED)
+    results.put(claimed)
+
+
+def test_processes_generate_each_word_once(ledger: JobLedger, tmp_path):
+    words = [f"sana{i}" for i in range(300)]
+    ledger.sync(_source(tmp_path, *words), lambda word: False)
+
+    context = multiprocessing.get_context("spawn")
+    start = context.Barrier(3)
+    results = context.Queue()
+    processes = [context.Process(target=_generate, args=(tmp_path, start, results)) for _ in range(3)]
+    for process in processes:
+        process.start()
+    claimed = [results.get(timeout=60) for _ in processes]
+    for process in processes:
+        process.join()
+
+    generated = [word for words in claimed for word in words]
+    assert sorted(generated) == sorted(words)
+    assert set(_states(ledger).values()) == {GENERATED}
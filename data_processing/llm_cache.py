@@ -0,0 +1,102 @@
+import hashlib
+import sqlite3
+import time
+from pathlib import Path
+from typing import Optional
+
+from data_processing.cache import SqliteDatabase
+from data_processing.settings import LANGUAGES_SRC, conf
+
+
+class LLMCache(SqliteDatabase):
+    """
+    Model responses keyed by a hash of the model, instructions and formatted prompt, with LRU eviction
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS responses (
+            key TEXT PRIMARY KEY,
+            response TEXT NOT NULL,
+            last_used REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS responses_last_used ON responses (last_used);
+    """
+
+    def __init__(self, path: Path, size: int):
+        super().__init__(path)
+        self.size = size
+        self.count = 0
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.size > 0
+
+    def _upgrade(self, connection: sqlite3.Connection):
+        # Counted on every new connection, put keeps it up to date after that
+        self.count = connection.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+
+    @staticmethod
+    def key(model: str, instructions: str, prompt: str) -> str:
+        digest = hashlib.sha256()
+        for part in (model, instructions, prompt):
+            digest.update(part.encode("utf-8"))
+            digest.update(b"\0")
+        return digest.hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        if not self.enabled:
+            return None
+
+        with self.lock:
+            connection = self._connect()
+            with connection:
+                row = connection.execute("SELECT response FROM responses WHERE key = ?", (key,)).fetchone()
+                if row is None:
+                    self.misses += 1
+                    return None
+                connection.execute("UPDATE responses SET last_used = ? WHERE key = ?", (time.time(), key))
+        self.hits += 1
+        return row[0]
+
+    def put(self, key: str, response: str):
+        if not self.enabled:
+            return
+
+        with self.lock:
+            connection = self._connect()
+            with connection:
+                cursor = connection.execute(
+                    "INSERT OR IGNORE INTO responses (key, response, last_used) VALUES (?, ?, ?)",
+                    (key, response, time.time()),
+                )
+                if cursor.rowcount:
+                    self.count += 1
+                else:
+                    connection.execute(
+                        "UPDATE responses SET response = ?, last_used = ? WHERE key = ?",
+                        (response, time.time(), key),
+                    )
+
+                # Evict the least recently used responses over the size limit
+                if self.count > self.size:
+                    connection.execute(
+                        "DELETE FROM responses WHERE key IN (SELECT key FROM responses ORDER BY last_used LIMIT ?)",
+                        (self.count - self.size,),
+                    )
+                    self.count = self.size
+
+    def summary(self) -> str:
+        total = max(self.hits + self.misses, 1)
+        return f"Model response cache: {self.hits:,} hits, {self.misses:,} misses ({self.hits / total * 100:.1f}% hit rate)."
+
+
+_cache: Optional[LLMCache] = None
+
+
+def get_llm_cache() -> LLMCache:
+    global _cache
+    if _cache is None:
+        _cache = LLMCache(LANGUAGES_SRC / conf.LLM_CACHE_FILE, conf.LLM_CACHE_SIZE)
+    return _cache
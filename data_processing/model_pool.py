@@ -0,0 +1,149 @@
+import time
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import AsyncIterator, Optional
+
+from openai import AsyncOpenAI
+from pydantic_ai import ModelSettings
+from pydantic_ai.messages import ModelMessage, ModelResponse
+from pydantic_ai.models import ModelRequestParameters, StreamedResponse
+from pydantic_ai.models.openai import OpenAIChatModel
+from pydantic_ai.models.wrapper import WrapperModel
+from pydantic_ai.providers import Provider
+from pydantic_ai.providers.openai import OpenAIProvider
+
+from data_processing.settings import Endpoint, conf
+from data_processing.utils import is_retryable
+
+# Weight of the latest request in the moving average of the latency
+LATENCY_SMOOTHING = 0.2
+
+
+@dataclass
+class EndpointState:
+    """
+    Load and health of one endpoint, shared by every model using it
+    """
+
+    url: str
+    weight: float
+    outstanding: int = 0
+    latency: Optional[float] = None
+    failures: int = 0
+    ejected_until: float = 0.0
+    requests: int = 0
+
+    def score(self) -> float:
+        # Unmeasured endpoints count as 1s per request, so they get tried early but not flooded
+        latency = self.latency if self.latency is not None else 1.0
+        return (self.outstanding + 1) * latency * (self.failures + 1) / self.weight
+
+    def succeeded(self, elapsed: float):
+        self.failures = 0
+        if self.latency is None:
+            self.latency = elapsed
+        else:
+            self.latency += LATENCY_SMOOTHING * (elapsed - self.latency)
+
+    def failed(self):
+        self.failures += 1
+        if self.failures >= conf.OPENAI_EJECT_FAILURES:
+            self.ejected_until = time.monotonic() + conf.OPENAI_EJECT_SECONDS
+
+
+_providers: dict[str, Provider[AsyncOpenAI]] = {}
+_endpoints: dict[str, EndpointState] = {}
+
+
+def _get_provider(endpoint: Endpoint) -> Provider[AsyncOpenAI]:
+    """
+    One provider and HTTP connection pool per endpoint, shared by the generate and analyze models
+    """
+    if endpoint.url not in _providers:
+        _providers[endpoint.url] = OpenAIProvider(
+            api_key=endpoint.api_key or conf.OPENAI_API_KEY,
+            base_url=endpoint.url,
+        )
+    return _providers[endpoint.url]
+
+
+def _get_endpoint_state(endpoint: Endpoint) -> EndpointState:
+    if endpoint.url not in _endpoints:
+        _endpoints[endpoint.url] = EndpointState(endpoint.url, endpoint.weight)
+    return _endpoints[endpoint.url]
+
+
+def get_endpoints() -> list[Endpoint]:
+    return conf.OPENAI_ENDPOINTS or [Endpoint(url=conf.OPENAI_PROVIDER)]
+
+
+class BalancedModel(WrapperModel):
+    """
+    Sends each request to the endpoint with the least outstanding requests weighted by latency, skipping endpoints
+    that failed repeatedly until their ejection time has passed
+    """
+
+    def __init__(self, model_name: str, endpoints: list[Endpoint], settings: Optional[ModelSettings] = None):
+        self.models = [
+            (
+                _get_endpoint_state(endpoint),
+                OpenAIChatModel(model_name, provider=_get_provider(endpoint), settings=settings),
+            )
+            for endpoint in endpoints
+        ]
+        super().__init__(self.models[0][1])
+
+    def _pick(self) -> tuple[EndpointState, OpenAIChatModel]:
+        now = time.monotonic()
+        healthy = [(state, model) for state, model in self.models if state.ejected_until <= now]
+        if not healthy:
+            # Everything is down, try the one that comes back first
+            return min(self.models, key=lambda item: item[0].ejected_until)
+        return min(healthy, key=lambda item: item[0].score())
+
+    @asynccontextmanager
+    async def _track(self, state: EndpointState) -> AsyncIterator[None]:
+        state.outstanding += 1
+        state.requests += 1
+        start = time.monotonic()
+        try:
+            yield
+        except Exception as e:
+            if is_retryable(e):
+                state.failed()
+            raise
+        else:
+            state.succeeded(time.monotonic() - start)
+        finally:
+            state.outstanding -= 1
+
+    async def request(
+        self,
+        messages: list[ModelMessage],
+        model_settings: Optional[ModelSettings],
+        model_request_parameters: ModelRequestParameters,
+    ) -> ModelResponse:
+        state, model = self._pick()
+        async with self._track(state):
+            return await model.request(messages, model_settings, model_request_parameters)
+
+    @asynccontextmanager
+    async def request_stream(self, messages: list[ModelMessage], model_settings: Optional[ModelSettings],
+                             model_request_parameters: ModelRequestParameters,
+                             *args, **kwargs) -> AsyncIterator[StreamedResponse]:
+        state, model = self._pick()
+        async with self._track(state):
+            async with model.request_stream(
+                messages, model_settings, model_request_parameters, *args, **kwargs
+            ) as response_stream:
+                yield response_stream
+
+
+def endpoint_summary() -> str:
+    if len(_endpoints) < 2:
+        return ""
+    return "Endpoints: " + ", ".join(
+        f"{state.url} {state.requests:,} requests"
+        + (f" {state.latency:.1f}s avg" if state.latency is not None else "")
+        for state in _endpoints.values()
+    ) + "."
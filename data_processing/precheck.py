@@ -0,0 +1,111 @@
+import re
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Callable, Optional
+
+import orjson
+
+from data_processing.settings import LANGUAGES_DST, conf
+from data_processing.utils import GenerateResponse
+from data_processing.words import normalize_word
+
+# A rule gets the language, word and generated result, and returns the reason the rule applies or None
+Rule = Callable[[str, str, GenerateResponse], Optional[str]]
+
+
+def no_translations(language_id: str, word: str, result: GenerateResponse) -> Optional[str]:
+    if not any(translation.strip() for translation in result.translation):
+        return "no translations"
+    return None
+
+
+def blank_context(language_id: str, word: str, result: GenerateResponse) -> Optional[str]:
+    if not result.context.strip():
+        return "blank context"
+    return None
+
+
+def no_sentences(language_id: str, word: str, result: GenerateResponse) -> Optional[str]:
+    if not any(sentence.strip() for sentence in result.sentences):
+        return "no example sentences"
+    return None
+
+
+def word_not_in_sentences(language_id: str, word: str, result: GenerateResponse) -> Optional[str]:
+    # The exact form has to be used at least once, not only other forms of the word
+    pattern = re.compile(rf"(?<!\w){re.escape(word)}(?!\w)")
+    if not any(pattern.search(normalize_word(sentence)) for sentence in result.sentences):
+        return "word not in the example sentences"
+    return None
+
+
+def matches_translator(language_id: str, word: str, result: GenerateResponse) -> Optional[str]:
+    known = get_translator_words(language_id).get(word)
+    if known and known & {translation.strip().lower() for translation in result.translation}:
+        return "translation confirmed by Translator"
+    return None
+
+
+# Any of these finding a problem fails the result without asking the model
+FAIL_RULES: list[Rule] = [no_translations, blank_context, no_sentences, word_not_in_sentences]
+# Extra failing rules for a single language, e.g. checks of its spelling or grammar
+LANGUAGE_FAIL_RULES: dict[str, list[Rule]] = {}
+
+# With ANALYZE_AUTO_PASS a result no failing rule applies to passes without asking the model if all of these apply
+PASS_RULES: list[Rule] = [matches_translator]
+LANGUAGE_PASS_RULES: dict[str, list[Rule]] = {}
+
+
+@dataclass
+class PrecheckStats:
+    failed: int = 0
+    passed: int = 0
+    reasons: Counter = field(default_factory=Counter)
+
+    def summary(self) -> str:
+        reasons = ", ".join(f"{reason} {count:,}" for reason, count in self.reasons.most_common())
+        return (
+            f"Pre-checks saved {self.failed + self.passed:,} model calls, failed {self.failed:,} and passed "
+            f"{self.passed:,} words" + (f" ({reasons})." if reasons else ".")
+        )
+
+
+precheck_stats = PrecheckStats()
+
+_translator_words: dict[str, dict[str, set[str]]] = {}
+
+
+def get_translator_words(language_id: str) -> dict[str, set[str]]:
+    """
+    The English translations Translator gave for each word in words.json, lower case
+    """
+    if language_id not in _translator_words:
+        path = LANGUAGES_DST / language_id / "words.json"
+        entries = orjson.loads(path.read_bytes()) if path.exists() else []
+        _translator_words[language_id] = {
+            normalize_word(entry["source"]): {translation["word"].lower() for translation in entry["translations"]}
+            for entry in entries
+        }
+    return _translator_words[language_id]
+
+
+def precheck(language_id: str, word: str, result: GenerateResponse) -> Optional[bool]:
+    """
+    Decide the analysis without the model when the rules are certain. False if a failing rule applies, True if
+    ANALYZE_AUTO_PASS is on and all the passing rules apply, None to leave it to the model.
+    """
+    for rule in FAIL_RULES + LANGUAGE_FAIL_RULES.get(language_id, []):
+        reason = rule(language_id, word, result)
+        if reason is not None:
+            precheck_stats.failed += 1
+            precheck_stats.reasons[reason] += 1
+            return False
+
+    if not conf.ANALYZE_AUTO_PASS:
+        return None
+
+    for rule in PASS_RULES + LANGUAGE_PASS_RULES.get(language_id, []):
+        if rule(language_id, word, result) is None:
+            return None
+    precheck_stats.passed += 1
+    return True
@@ -0,0 +1,205 @@
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import replace
+from time import perf_counter
+from typing import Iterator, Optional
+
+from rich import print
+from tqdm import tqdm
+
+from data_processing.cache import CacheEntry, get_cache
+from data_processing.dictionary import (
+    DICTIONARIES,
+    LANGUAGE_DICTS,
+    NO_RESULTS,
+    extract_html,
+    fetch_raw,
+    is_stale,
+    parse_stats,
+    set_fetch_workers,
+)
+from data_processing.settings import conf
+from data_processing.utils import make_process_pool, retry_stats
+from data_processing.words import get_word_source
+
+
+def _extract(dictionary: str, word: str, language_id: str, html: str) -> tuple[str, float]:
+    """
+    Runs in the extraction processes, returns the text and the time spent parsing
+    """
+    parse_start = parse_stats.seconds
+    text = extract_html(dictionary, word, language_id, html)
+    return text, parse_stats.seconds - parse_start
+
+
+class Pipeline:
+    """
+    Fetches pages on a pool of threads and extracts the definitions on a pool of processes.
+
+    At most `queue_size` words are in flight between the stages, and results are returned in the order the words
+    were given. Each result is the new cache entry, and whether it changed from the cached one.
+    """
+
+    def __init__(self, fetch_workers: int, extract_workers: int, queue_size: int):
+        self.fetch_pool = ThreadPoolExecutor(max_workers=fetch_workers)
+        # The extraction processes are started from the fetch threads
+        self.extract_pool = make_process_pool(extract_workers)
+        self.queue_size = queue_size
+
+    def _submit(self, dictionary: str, word: str, language_id: str, cached: Optional[CacheEntry]) -> Future:
+        result = Future()
+
+        def _fetched(fetch_future: Future):
+            try:
+                page = fetch_future.result()
+            except Exception as e:
+                result.set_exception(e)
+                return
+
+            now = time.time()
+            if page is None:
+                result.set_result((CacheEntry(NO_RESULTS, fetched_at=now), True))
+                return
+
+            if page.not_modified:
+                # Nothing to parse
+                result.set_result((replace(cached, fetched_at=now), False))
+                return
+
+            def _extracted(extract_future: Future):
+                try:
+                    text, parse_seconds = extract_future.result()
+                except Exception as e:
+                    result.set_exception(e)
+                    return
+                parse_stats.pages += 1
+                parse_stats.seconds += parse_seconds
+                result.set_result((CacheEntry(text, page.etag, page.last_modified, now), True))
+
+            try:
+                extract_future = self.extract_pool.submit(_extract, dictionary, word, language_id, page.html)
+            except RuntimeError as e:
+                # The pool is shutting down
+                result.set_exception(e)
+                return
+            extract_future.add_done_callback(_extracted)
+
+        self.fetch_pool.submit(fetch_raw, dictionary, word, cached).add_done_callback(_fetched)
+        return result
+
+    def run(self, language_id: str, items: list[tuple[str, str, Optional[CacheEntry]]]) -> Iterator[
+        tuple[str, str, Future]
+    ]:
+        """
+        Process the (dictionary, word, cached entry) items, yields each with its finished future in the original
+        order
+        """
+        pending = deque()
+        items = iter(items)
+        while True:
+            while len(pending) < self.queue_size:
+                item = next(items, None)
+                if item is None:
+                    break
+                dictionary, word, cached = item
+                pending.append((dictionary, word, self._submit(dictionary, word, language_id, cached)))
+
+            if not pending:
+                return
+
+            dictionary, word, future = pending.popleft()
+            # Wait for the oldest word, the others keep going in the background
+            future.exception()
+            yield dictionary, word, future
+
+    def shutdown(self):
+        self.fetch_pool.shutdown(cancel_futures=True)
+        self.extract_pool.shutdown(cancel_futures=True)
+
+
+def main():
+    """
+    Fill the dictionary cache for every word of every configured language, so later runs don't need the network.
+    With --refresh entries older than DICTIONARY_MAX_AGE_DAYS are revalidated with conditional requests.
+    """
+    languages = conf.LANGUAGES
+    refresh = "--refresh" in sys.argv
+    workers = conf.DICTIONARY_PREFETCH_WORKERS
+    extract_workers = conf.DICTIONARY_EXTRACT_WORKERS or os.cpu_count()
+
+    if "--language" in sys.argv:
+        language_idx = sys.argv.index("--language") + 1
+        languages = [sys.argv[language_idx]]
+
+    if "--workers" in sys.argv:
+        workers_idx = sys.argv.index("--workers") + 1
+        workers = max(int(sys.argv[workers_idx]), 1)
+
+    if "--extract-workers" in sys.argv:
+        extract_workers_idx = sys.argv.index("--extract-workers") + 1
+        extract_workers = max(int(sys.argv[extract_workers_idx]), 1)
+
+    set_fetch_workers(workers)
+
+    total_start = perf_counter()
+    cached = 0
+    fetched = 0
+    not_modified = 0
+    failed = 0
+
+    pipeline = Pipeline(workers, extract_workers, conf.DICTIONARY_PIPELINE_QUEUE)
+    try:
+        for language_id in languages:
+            language = conf.LANGUAGES[language_id]
+            print(f" ----- {language} -----")
+
+            items = []
+            words = list(get_word_source(language_id))
+            for dict_func in LANGUAGE_DICTS[language_id]:
+                dict_name = dict_func.__name__
+                if dict_name not in DICTIONARIES:
+                    continue
+                existing = get_cache().get_entries(language_id, dict_name, words)
+                now = time.time()
+                for word in words:
+                    entry = existing.get(word)
+                    if entry is None:
+                        items.append((dict_name, word, None))
+                    elif refresh and is_stale(dict_name, entry, now):
+                        items.append((dict_name, word, entry))
+                    else:
+                        cached += 1
+
+            for dict_name, word, future in tqdm(pipeline.run(language_id, items), total=len(items), colour="green"):
+                try:
+                    entry, changed = future.result()
+                    if changed:
+                        get_cache().put_entries(language_id, dict_name, {word: entry})
+                        fetched += 1
+                    else:
+                        get_cache().touch(language_id, dict_name, word, entry.fetched_at)
+                        not_modified += 1
+                except Exception as e:
+                    print(f"Failed to fetch {word} from {dict_name}: {e}")
+                    failed += 1
+
+            print("")
+    except KeyboardInterrupt:
+        print("Aborting...")
+    finally:
+        pipeline.shutdown()
+        # Refreshed definitions can leave texts nothing refers to
+        get_cache().prune()
+
+    total_elapsed = perf_counter() - total_start
+    print(
+        f"Fetched {fetched:,}, not modified {not_modified:,}, already cached {cached:,}, failed {failed:,} "
+        f"dictionary entries in {total_elapsed:.1f}s."
+    )
+    for language_id in languages:
+        print(get_cache().dedup_stats(language_id).summary())
+    print(parse_stats.summary())
+    print(retry_stats.summary())
@@ -0,0 +1,149 @@
+import math
+import re
+from dataclasses import dataclass
+from functools import lru_cache
+
+from data_processing.settings import conf
+
+TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]")
+
+# Wiktionary section headings by priority, lower is kept first when a definition is over its budget
+WIKTIONARY_SENSES = (
+    "Noun", "Verb", "Adjective", "Adverb", "Pronoun", "Postposition", "Preposition", "Conjunction", "Interjection",
+    "Numeral", "Particle", "Proper noun", "Suffix", "Prefix", "Determiner", "Phrase", "Participle", "Contraction",
+    "Abbreviation", "Letter", "Idiom", "Proverb",
+)
+WIKTIONARY_PRIORITIES = {
+    **dict.fromkeys(WIKTIONARY_SENSES, 0),
+    **dict.fromkeys(("Declension", "Conjugation", "Inflection"), 1),
+    "Usage notes": 2,
+    **dict.fromkeys((
+        "Synonyms", "Antonyms", "Hypernyms", "Hyponyms", "Coordinate terms", "Related terms", "Derived terms",
+        "Compounds", "Alternative forms", "See also",
+    ), 3),
+    **dict.fromkeys(("Pronunciation", "Syllabification", "Hyphenation"), 4),
+    "Etymology": 5,
+    **dict.fromkeys(("References", "Further reading", "Descendants", "Anagrams"), 6),
+}
+# The language name and links before the first heading
+WIKTIONARY_PREAMBLE = 4
+
+# Dictionaries whose definitions can be split into sections, the others are cut from the end
+SECTION_PRIORITIES = {
+    "wiktionary": (WIKTIONARY_PRIORITIES, WIKTIONARY_PREAMBLE),
+}
+
+HEADING_NUMBER = re.compile(r" \d+$")
+
+
+@dataclass
+class BudgetStats:
+    prompts: int = 0
+    trimmed: int = 0
+    tokens_before: int = 0
+    tokens_after: int = 0
+
+    def summary(self) -> str:
+        before = self.tokens_before / max(self.prompts, 1)
+        after = self.tokens_after / max(self.prompts, 1)
+        saved = 1 - self.tokens_after / max(self.tokens_before, 1)
+        return (
+            f"Dictionary definitions averaged {before:,.0f} estimated tokens per prompt, {after:,.0f} after trimming "
+            f"{self.trimmed:,} definitions to PROMPT_TOKEN_BUDGET ({saved:.0%} saved)."
+        )
+
+
+budget_stats = BudgetStats()
+
+
+@lru_cache(maxsize=4096)
+def estimate_tokens(text: str) -> int:
+    """
+    Rough token count without a model specific tokenizer, about four characters per token of a word and one token
+    per punctuation mark
+    """
+    return sum(
+        max(1, math.ceil(len(token) / 4)) if token[0].isalnum() or token[0] == "_" else 1
+        for token in TOKEN_PATTERN.findall(text)
+    )
+
+
+def split_sections(dictionary: str, text: str) -> list[tuple[int, str]]:
+    """
+    The definition split at its section headings, each section with its priority
+    """
+    if dictionary not in SECTION_PRIORITIES:
+        return [(0, text)]
+
+    priorities, priority = SECTION_PRIORITIES[dictionary]
+    sections = []
+    lines = []
+    for line in text.split("\n"):
+        heading = priorities.get(HEADING_NUMBER.sub("", line.strip()))
+        if heading is not None:
+            if lines:
+                sections.append((priority, "\n".join(lines)))
+            priority = heading
+            lines = []
+        lines.append(line)
+    if lines:
+        sections.append((priority, "\n".join(lines)))
+    return sections
+
+
+def _cut(text: str, budget: int) -> str:
+    """
+    As many whole lines from the start of the text as fit the budget
+    """
+    kept = []
+    for line in text.split("\n"):
+        tokens = estimate_tokens(line)
+        if tokens > budget:
+            break
+        kept.append(line)
+        budget -= tokens
+    return "\n".join(kept).rstrip()
+
+
+@lru_cache(maxsize=4096)
+def trim_definition(dictionary: str, text: str, budget: int) -> str:
+    """
+    Keep the most relevant sections of the definition that fit the token budget, in their original order. The
+    sections are taken by priority, and the first one that doesn't fit is cut short.
+
+    The same definition trimmed again is the same object, like the definitions themselves.
+    """
+    if estimate_tokens(text) <= budget:
+        return text
+
+    sections = split_sections(dictionary, text)
+    order = sorted(range(len(sections)), key=lambda idx: (sections[idx][0], idx))
+    kept = {}
+    for idx in order:
+        section = sections[idx][1]
+        tokens = estimate_tokens(section)
+        if tokens > budget:
+            kept[idx] = _cut(section, budget)
+            break
+        kept[idx] = section
+        budget -= tokens
+
+    return "\n".join(kept[idx] for idx in sorted(kept) if kept[idx])
+
+
+def fit_definitions(definitions: dict[str, str]) -> dict[str, str]:
+    """
+    Trim each definition to the PROMPT_TOKEN_BUDGET of its dictionary, dictionaries without a budget are kept whole
+    """
+    budget_stats.prompts += 1
+    result = {}
+    for dictionary, text in definitions.items():
+        before = estimate_tokens(text)
+        budget = conf.PROMPT_TOKEN_BUDGET.get(dictionary)
+        if budget is not None and before > budget:
+            text = trim_definition(dictionary, text, budget)
+            budget_stats.trimmed += 1
+        budget_stats.tokens_before += before
+        budget_stats.tokens_after += estimate_tokens(text)
+        result[dictionary] = text
+    return result
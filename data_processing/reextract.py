@@ -0,0 +1,82 @@
+import os
+import sys
+from dataclasses import replace
+from time import perf_counter
+
+from rich import print
+from tqdm import tqdm
+
+from data_processing.cache import (
+    CacheEntry,
+    decompress_page,
+    get_cache,
+    get_raw_archive,
+)
+from data_processing.dictionary import LANGUAGE_DICTS, extract_html
+from data_processing.settings import conf
+from data_processing.utils import make_process_pool
+from data_processing.words import get_word_source
+
+CHUNK_SIZE = 200
+
+
+def _extract_chunk(dictionary: str, language_id: str, pages: dict[str, bytes]) -> dict[str, str]:
+    return {
+        word: extract_html(dictionary, word, language_id, decompress_page(compressed))
+        for word, compressed in pages.items()
+    }
+
+
+def main():
+    """
+    Re-run the dictionary extractors over the archived raw pages and rewrite the definitions cache, without
+    any network access
+    """
+    languages = conf.LANGUAGES
+    workers = os.cpu_count()
+
+    if "--language" in sys.argv:
+        language_idx = sys.argv.index("--language") + 1
+        languages = [sys.argv[language_idx]]
+
+    if "--workers" in sys.argv:
+        workers_idx = sys.argv.index("--workers") + 1
+        workers = max(int(sys.argv[workers_idx]), 1)
+
+    total_start = perf_counter()
+    extracted = 0
+    missing = 0
+
+    with make_process_pool(workers) as executor:
+        for language_id in languages:
+            words = list(get_word_source(language_id))
+
+            for dict_func in LANGUAGE_DICTS[language_id]:
+                dictionary = dict_func.__name__
+                print(f" ----- {conf.LANGUAGES[language_id]} {dictionary} -----")
+
+                archive = get_raw_archive(dictionary)
+                futures = []
+                for start in range(0, len(words), CHUNK_SIZE):
+                    pages = archive.get_compressed_many(words[start:start + CHUNK_SIZE])
+                    missing += min(CHUNK_SIZE, len(words) - start) - len(pages)
+                    futures.append(executor.submit(_extract_chunk, dictionary, language_id, pages))
+
+                for future in tqdm(futures, colour="green"):
+                    definitions = future.result()
+                    # Keep the validators and fetch time of the page the text was extracted from
+                    existing = get_cache().get_entries(language_id, dictionary, definitions)
+                    get_cache().put_entries(language_id, dictionary, {
+                        word: replace(existing[word], contents=text) if word in existing else CacheEntry(text)
+                        for word, text in definitions.items()
+                    })
+                    extracted += len(definitions)
+
+                print("")
+
+    get_cache().prune()
+    total_elapsed = perf_counter() - total_start
+    print(
+        f"Extracted {extracted:,} definitions from archived pages in {total_elapsed:.1f}s, "
+        f"{missing:,} words had no archived page."
+    )
@@ -2,9 +2,9 @@ from rich import print
 from rich.console import Console
 from rich.table import Table
 
-from data_processing.ai import get_word_data
+from data_processing.ai_store import get_ai_store
 from data_processing.settings import conf
-from data_processing.utils import list_words
+from data_processing.words import get_word_source
 
 
 def main():
@@ -14,9 +14,13 @@ def main():
 
         print(f" ----- {language} -----")
 
-        for word in sorted(list_words(language_id)):
+        store = get_ai_store(language_id)
+        for word in get_word_source(language_id).sorted():
+            word_data = store.get(word)
+            if word_data is None:
+                continue
+
             try:
-                word_data = get_word_data(language_id, word)
                 table = Table(title=word)
                 table.add_column("Translation", no_wrap=True)
                 table.add_column("Sentence")
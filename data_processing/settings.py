@@ -1,7 +1,7 @@
 from pathlib import Path
 from typing import Optional
 
-from pydantic import Field
+from pydantic import BaseModel, Field
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 CWD = Path(".")
@@ -9,20 +9,75 @@ LANGUAGES_DST = CWD / "frontend" / "src" / "languages"
 LANGUAGES_SRC = CWD / "data_processing" / "languages"
 
 
+class Endpoint(BaseModel):
+    url: str
+    weight: float = 1.0
+    api_key: str = ""  # Defaults to OPENAI_API_KEY
+
+
 class Config(BaseSettings):
     TRANSLATOR_ENDPOINT: str = "https://api.cognitive.microsofttranslator.com/"
     TRANSLATOR_LOCATION: str = "global"
     TRANSLATOR_KEY: Optional[str] = Field(None)
+    TRANSLATOR_WORKERS: int = 4  # Concurrent lookup requests
+    TRANSLATOR_CHECKPOINT_WORDS: int = 50  # Write words.json after this many new translations
+    TRANSLATOR_CHECKPOINT_SECONDS: float = 30.0  # ... or after this long since the last write
 
     LANGUAGES: dict[str, str] = {
         "et": "Estonian",
         "fi": "Finnish",
     }
+    WORD_LIST_CHUNK_WORDS: int = 1_000_000  # Longer word lists are deduplicated and sorted in chunks on disk
+
+    # "sqlite" or "files", migrate with `migrate_cache`. The files in languages/<language>/<dictionary>/ are the
+    # copy tracked in git, the SQLite cache is a local index that reads and writes through to them.
+    DICTIONARY_CACHE: str = "sqlite"
+    DICTIONARY_CACHE_FILE: str = "dictionary_cache.sqlite3"
+    DICTIONARY_ARCHIVE_RAW: bool = False  # Keep compressed raw pages in languages/raw/ for `reextract`
+    # Cached definitions older than this are revalidated by `prefetch --refresh`, None keeps them forever
+    DICTIONARY_MAX_AGE_DAYS: dict[str, Optional[float]] = {
+        "ekss": 365.0,
+        "wiktionary": 90.0,
+    }
+    DICTIONARY_NOT_FOUND_MAX_AGE_DAYS: float = 30.0  # Same for words the dictionary had no entry for
+    DICTIONARY_FAILURE_TTL: float = 600.0  # Seconds before a word that failed to fetch is tried again
+    DICTIONARY_BREAKER_FAILURES: int = 5  # Consecutive failures before requests to a host are stopped
+    DICTIONARY_BREAKER_COOLDOWN: float = 60.0  # Seconds before a stopped host is tried again
+    DICTIONARY_RETRIES: int = 2  # Retries of a failed page fetch, before giving up on the word for now
+    DICTIONARY_RETRY_DEADLINE: float = 30.0  # Seconds after the first attempt to stop retrying
+    HTML_PARSER: str = "lxml"  # BeautifulSoup tree builder, compare with `dictionary_bench --parsers` when changing
+    DICTIONARY_REQUESTS_PER_SECOND: float = 2.0  # Per dictionary host
+    DICTIONARY_PREFETCH_WORKERS: int = 8
+    DICTIONARY_EXTRACT_WORKERS: Optional[int] = None  # Defaults to the number of CPUs
+    DICTIONARY_PIPELINE_QUEUE: int = 64  # Pages fetched ahead of extraction
 
     OPENAI_PROVIDER: str = "http://127.0.0.1:1234/v1"  # E.g. locally hosted LM Studio
     OPENAI_GENERATE_MODEL: str = "llama-3.3-70b-instruct"
     OPENAI_ANALYZE_MODEL: Optional[str] = ""
     OPENAI_API_KEY: str = ""
+    # Spread requests over several servers instead of OPENAI_PROVIDER, e.g. as JSON in the environment:
+    # OPENAI_ENDPOINTS='[{"url": "http://box1:1234/v1", "weight": 2}, {"url": "http://box2:8000/v1"}]'
+    OPENAI_ENDPOINTS: list[Endpoint] = []
+    OPENAI_EJECT_FAILURES: int = 3  # Consecutive failures before an endpoint is taken out of rotation
+    OPENAI_EJECT_SECONDS: float = 30.0  # ... for this long
+    LLM_RETRIES: int = 5  # Retries of model requests on throttling, server and connection errors
+    LLM_RETRY_DEADLINE: float = 300.0  # Seconds after the first attempt to stop retrying
+    # Estimated tokens of each dictionary's definition in a prompt, the least relevant sections are dropped first.
+    # Dictionaries that aren't listed are sent whole.
+    PROMPT_TOKEN_BUDGET: dict[str, int] = {
+        "ekss": 1500,
+        "wiktionary": 1000,
+    }
+    LLM_BATCH_SIZE_DEFAULT: int = 1  # Words per model request, more saves round trips and repeated instructions
+    LLM_BATCH_SIZE: dict[str, int] = {}  # ... by model name, e.g. LLM_BATCH_SIZE='{"llama-3.3-70b-instruct": 8}'
+    LLM_GROUP_MAX_WORDS: int = 12  # Most forms of one lemma sent in a request by `ai_generate --group-lemmas`
+    # Results that pass the rule based pre-checks and share a translation with Translator are accepted without
+    # asking the analyze model, results failing a pre-check are always rejected without it
+    ANALYZE_AUTO_PASS: bool = False
+    AI_WORKER_LEASE_SECONDS: float = 900.0  # A word claimed by a worker that stops responding is freed after this
+
+    LLM_CACHE_FILE: str = "llm_cache.sqlite3"
+    LLM_CACHE_SIZE: int = 50_000  # Maximum number of cached model responses, 0 disables the cache
 
     model_config = SettingsConfigDict(env_file='.env', env_file_encoding='utf-8')
 
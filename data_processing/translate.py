@@ -1,14 +1,27 @@
 import os
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
 from copy import copy
 from pathlib import Path
+from typing import Iterable, Iterator, Optional
 from uuid import uuid4
 
 import orjson
 import requests
 from loguru import logger
 from pydantic import BaseModel
+from requests.adapters import HTTPAdapter
 
 from data_processing.settings import conf
+from data_processing.utils import (
+    RetryableError,
+    parse_retry_after,
+    retry,
+    retry_stats,
+    write_atomic,
+)
+from data_processing.words import WordSource, normalize_word
 
 CWD = Path(".")
 LANGUAGES_DST = CWD / "frontend" / "src" / "languages"
@@ -18,8 +31,15 @@ LOOKUP_HEADERS = {
     "Ocp-Apim-Subscription-Region": conf.TRANSLATOR_LOCATION,
     "Content-Type": "application/json",
 }
-LOOKUP_URL = conf.TRANSLATOR_ENDPOINT + "/dictionary/lookup"
+LOOKUP_URL = conf.TRANSLATOR_ENDPOINT.rstrip("/") + "/dictionary/lookup"
+# Limits of the dictionary lookup endpoint, per request
+LOOKUP_MAX_ITEMS = 10
+LOOKUP_MAX_ITEM_CHARS = 100
+LOOKUP_MAX_CHARS = 1000
+LOOKUP_RETRIES = 5
 SESSION = requests.Session()
+SESSION.mount("https://", HTTPAdapter(pool_maxsize=conf.TRANSLATOR_WORKERS))
+SESSION.mount("http://", HTTPAdapter(pool_maxsize=conf.TRANSLATOR_WORKERS))
 
 
 class Language(BaseModel):
@@ -39,7 +59,41 @@ class Word(BaseModel):
     translations: list[TranslatedWord]
 
 
-def get_translation(code, source) -> dict:
+class CheckpointWriter:
+    """
+    Writes the word data file after every `every_words` changes or `every_seconds`, whichever comes first
+    """
+
+    def __init__(self, path: Path, word_data: dict[str, dict], every_words: int, every_seconds: float):
+        self.path = path
+        self.word_data = word_data
+        self.every_words = every_words
+        self.every_seconds = every_seconds
+        self.pending = 0
+        self.last_write = time.monotonic()
+
+    def changed(self):
+        self.pending += 1
+        if self.pending >= self.every_words or time.monotonic() - self.last_write >= self.every_seconds:
+            self.flush()
+
+    def flush(self):
+        data = orjson.dumps(list(self.word_data.values()), option=orjson.OPT_INDENT_2)
+        write_atomic(self.path, data)
+        self.pending = 0
+        self.last_write = time.monotonic()
+
+
+def _log_retry(name: str, attempt: int, error: Optional[BaseException], wait: Optional[float]):
+    if error is not None and wait is not None:
+        logger.warning("{error}, retrying in {wait:.1f}s", error=error, wait=wait)
+
+
+@retry(retries=LOOKUP_RETRIES, delay=1, hooks=(retry_stats.on_attempt, _log_retry))
+def get_translations(code, sources: list[str]) -> list[dict]:
+    """
+    Look up a batch of words, retrying with backoff when the service is throttling or failing
+    """
     headers = copy(LOOKUP_HEADERS)
     headers["X-ClientTraceId"] = str(uuid4())
 
@@ -49,12 +103,67 @@ def get_translation(code, source) -> dict:
         "to": "en",
     }
 
-    body = [{"text": source}]
+    body = [{"text": source} for source in sources]
 
     response = SESSION.post(LOOKUP_URL, params=params, headers=headers, json=body)
-    result = response.json()
+    if response.status_code == 429 or response.status_code >= 500:
+        raise RetryableError(
+            f"Translator returned {response.status_code}",
+            retry_after=parse_retry_after(response.headers.get("Retry-After")),
+        )
+
+    response.raise_for_status()
     # See https://docs.microsoft.com/en-us/azure/cognitive-services/translator/quickstart-translator?tabs=python#dictionary-lookup-alternate-translations
-    return result
+    return response.json()
+
+
+def make_batches(sources: Iterable[str]) -> Iterator[list[str]]:
+    """
+    Pack the words into batches within the per-request item and character limits
+    """
+    batch = []
+    chars = 0
+    for source in sources:
+        if len(source) > LOOKUP_MAX_ITEM_CHARS:
+            logger.warning("Word {source} is too long to look up, skipping...", source=source)
+            continue
+
+        if len(batch) >= LOOKUP_MAX_ITEMS or chars + len(source) > LOOKUP_MAX_CHARS:
+            yield batch
+            batch = []
+            chars = 0
+
+        batch.append(source)
+        chars += len(source)
+
+    if batch:
+        yield batch
+
+
+def translate_words(code, sources: Iterable[str]) -> Iterator[tuple[str, list[dict]]]:
+    """
+    Look up the words in batches over a pool of threads, yields each word with its lookup results in word order
+    """
+
+    def _results(batch: list[str], future: Future) -> Iterator[tuple[str, list[dict]]]:
+        # Results are in the same order as the words in the request
+        for source, result in zip(batch, future.result()):
+            yield source, [result]
+
+    with ThreadPoolExecutor(max_workers=conf.TRANSLATOR_WORKERS) as executor:
+        # A couple of batches per worker in flight, consumed in the order they were submitted
+        pending: deque[tuple[list[str], Future]] = deque()
+        try:
+            for batch in make_batches(sources):
+                pending.append((batch, executor.submit(get_translations, code, batch)))
+                if len(pending) >= 2 * conf.TRANSLATOR_WORKERS:
+                    yield from _results(*pending.popleft())
+
+            while pending:
+                yield from _results(*pending.popleft())
+        finally:
+            for _, future in pending:
+                future.cancel()
 
 
 def detect_languages() -> list[Language]:
@@ -117,8 +226,8 @@ def process_language(language: Language):
     and update the word data file for frontend.
     """
 
-    word_data: list[dict] = []
-    translated_words: list[str] = []
+    # Translated words by source word, in the order they're written out
+    word_data: dict[str, dict] = {}
     logger.info("Processing {lang}", lang=language.name)
 
     if language.dst_file.exists():
@@ -130,18 +239,20 @@ def process_language(language: Language):
             if not is_translated(word["source"], word["translations"]):
                 continue
 
-            word_data.append(word)
-            translated_words.append(word["source"])
+            # Older files have words as they were in the word list, the word list is normalized now
+            source = normalize_word(word["source"])
+            if source not in word_data:
+                word_data[source] = {**word, "source": source}
     else:
         # Ensure parent path exists
         language.dst_file.parent.mkdir(parents=True, exist_ok=True)
 
-    def _write_data():
-        """
-        Write the word data file for this language
-        """
-        data = orjson.dumps(word_data, option=orjson.OPT_INDENT_2)
-        language.dst_file.write_bytes(data)
+    writer = CheckpointWriter(
+        language.dst_file,
+        word_data,
+        every_words=conf.TRANSLATOR_CHECKPOINT_WORDS,
+        every_seconds=conf.TRANSLATOR_CHECKPOINT_SECONDS,
+    )
 
     def _add_translation(source, translate_results):
         """
@@ -172,46 +283,38 @@ def process_language(language: Language):
             translations=translations,
         )
 
-        translated_words.append(source)
-        word_data.append(
-            Word(
-                source=source,
-                translations=[
-                    TranslatedWord(
-                        word=word["word"],
-                        tag=word["tag"],
-                    )
-                    for word in translations
-                ],
-            ).dict()
-        )
-
-        # A bit excessive, but this way we save time and API calls while developing
-        _write_data()
+        # Replaces any previous translation in place
+        word_data[source] = Word(
+            source=source,
+            translations=[
+                TranslatedWord(
+                    word=word["word"],
+                    tag=word["tag"],
+                )
+                for word in translations
+            ],
+        ).dict()
 
-    # Loop through every word
-    with language.word_file.open(encoding="utf-8") as file:
-        for word in file.readlines():
-            word = word.strip()
-            if word == "":
-                # Skip empty lines
-                continue
+        # Save progress every now and then, so an interrupted run doesn't waste API calls
+        writer.changed()
 
-            if word in translated_words:
+    def _untranslated_words() -> Iterator[str]:
+        for word in WordSource(language.word_file):
+            if word in word_data:
                 logger.debug(
                     "Word {word} is already translated, skipping...", word=word
                 )
                 continue
 
-            response = get_translation(
-                code=language.code,
-                source=word,
-            )
+            yield word
 
+    # Loop through every word
+    try:
+        for word, response in translate_words(language.code, _untranslated_words()):
             _add_translation(word, response)
-
-    # Just in case we optimize the saves later
-    _write_data()
+    finally:
+        # Also on errors and interrupts, so nothing already translated is lost
+        writer.flush()
 
 
 def main():
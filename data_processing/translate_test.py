@@ -0,0 +1,134 @@
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import orjson
+import pytest
+
+from data_processing import translate, utils
+from data_processing.translate import get_translations, make_batches, translate_words
+
+
+class TranslatorStub(ThreadingHTTPServer):
+    """
+    Local dictionary lookup endpoint, answers with the queued error statuses first and then looks the words up
+    """
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), TranslatorHandler)
+        self.errors: list[tuple[int, dict[str, str]]] = []
+        self.requests: list[list[str]] = []
+        self.delays: dict[str, float] = {}
+        self.lock = threading.Lock()
+
+
+class TranslatorHandler(BaseHTTPRequestHandler):
+    server: TranslatorStub
+
+    def do_POST(self):
+        body = orjson.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        sources = [item["text"] for item in body]
+        with self.server.lock:
+            self.server.requests.append(sources)
+            error = self.server.errors.pop(0) if self.server.errors else None
+
+        if error is not None:
+            status, headers = error
+            self.send_response(status)
+            for name, value in headers.items():
+                self.send_header(name, value)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        time.sleep(max(self.server.delays.get(source, 0) for source in sources))
+        # Same shape as the dictionary lookup response
+        data = orjson.dumps([
+            {
+                "normalizedSource": source,
+                "displaySource": source,
+                "translations": [
+                    {
+                        "normalizedTarget": source.upper(),
+                        "displayTarget": source.upper(),
+                        "posTag": "NOUN",
+                        "confidence": 1.0,
+                        "prefixWord": "",
+                        "backTranslations": [],
+                    }
+                ],
+            }
+            for source in sources
+        ])
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def translator(monkeypatch):
+    server = TranslatorStub()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    monkeypatch.setattr(translate, "LOOKUP_URL", f"http://127.0.0.1:{server.server_port}/dictionary/lookup")
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_batches_are_within_item_limit():
+    words = [f"sõna{i}" for i in range(25)]
+    assert [len(batch) for batch in make_batches(words)] == [10, 10, 5]
+    assert [word for batch in make_batches(words) for word in batch] == words
+
+
+def test_batches_are_within_char_limit(monkeypatch):
+    monkeypatch.setattr(translate, "LOOKUP_MAX_ITEMS", 100)
+    words = [str(i) * 90 for i in range(1, 10)] + ["a" * 90 for _ in range(14)]
+    batches = list(make_batches(words))
+    assert [len(batch) for batch in batches] == [11, 11, 1]
+    assert all(sum(map(len, batch)) <= translate.LOOKUP_MAX_CHARS for batch in batches)
+
+
+def test_too_long_words_are_skipped():
+    assert list(make_batches(["aasta", "a" * 101, "aeg"])) == [["aasta", "aeg"]]
+
+
+def test_lookup_retries_throttling_and_server_errors(translator, monkeypatch):
+    waits = []
+    monkeypatch.setattr(utils.time, "sleep", waits.append)
+    translator.errors = [(429, {"Retry-After": "7"}), (503, {})]
+
+    [result] = get_translations("et", ["aasta"])
+
+    assert result["displaySource"] == "aasta"
+    assert translator.requests == [["aasta"]] * 3
+    assert waits[0] >= 7
+    assert waits[1] <= 2
+
+
+def test_lookup_does_not_retry_client_errors(translator):
+    translator.errors = [(400, {})]
+    with pytest.raises(translate.requests.HTTPError):
+        get_translations("et", ["aasta"])
+    assert len(translator.requests) == 1
+
+
+def test_results_are_matched_to_words_in_order(translator, monkeypatch):
+    monkeypatch.setattr(translate.conf, "TRANSLATOR_WORKERS", 3)
+    words = [f"sõna{i}" for i in range(45)]
+    # The first batches finish last
+    translator.delays = {"sõna0": 0.3, "sõna10": 0.2}
+
+    results = list(translate_words("et", words))
+
+    assert [source for source, _ in results] == words
+    for source, [result] in results:
+        assert result["displaySource"] == source
+        assert result["translations"][0]["displayTarget"] == source.upper()
+    assert sorted(map(len, translator.requests)) == [5, 10, 10, 10, 10]
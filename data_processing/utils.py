@@ -1,10 +1,23 @@
+import asyncio
+import inspect
+import math
+import multiprocessing
+import os
+import random
 import time
-from functools import wraps
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from functools import partial, wraps
+from pathlib import Path
+from typing import Callable, Iterable, Optional
 
+import openai
+import requests
 from pydantic import BaseModel, Field
 
-from data_processing.settings import LANGUAGES_SRC
-
 
 class GenerateResponse(BaseModel):
     understood: bool = Field(
@@ -27,32 +40,216 @@ class AnalyzeResponse(BaseModel):
     )
 
 
+class WordGenerateResponse(GenerateResponse):
+    word: str = Field(description="The word this answer is for, exactly as given.")
+
+
+class WordAnalyzeResponse(AnalyzeResponse):
+    word: str = Field(description="The word this answer is for, exactly as given.")
+
+
+class RetryableError(Exception):
+    """
+    A failure that is expected to go away by itself, e.g. throttling or a server error. The server can suggest how
+    long to wait with `retry_after`.
+    """
+
+    def __init__(self, message: str, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """
+    Seconds to wait from a Retry-After header, which is either seconds or an HTTP date. None if it's missing or
+    can't be parsed, the usual backoff is used then.
+    """
+    if not value:
+        return None
+    try:
+        seconds = float(value)
+        return max(seconds, 0.0) if math.isfinite(seconds) else None
+    except ValueError:
+        pass
+
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max((retry_at - datetime.now(timezone.utc)).total_seconds(), 0.0)
+
+
+def is_retryable(e: BaseException) -> bool:
+    """
+    Timeouts, connection errors, throttling and server errors are worth retrying, anything else (e.g. a page or
+    model output that can't be parsed) will fail the same way again
+    """
+    if isinstance(e, RetryableError):
+        return True
+    if isinstance(e, (TimeoutError, ConnectionError, requests.Timeout, requests.ConnectionError,
+                      openai.APIConnectionError)):
+        return True
+
+    # HTTP errors of requests, openai and pydantic-ai
+    status_code = getattr(e, "status_code", None)
+    if status_code is None and isinstance(e, requests.HTTPError) and e.response is not None:
+        status_code = e.response.status_code
+    if status_code is not None:
+        return status_code == 429 or status_code >= 500
+
+    # Wrapped errors, e.g. pydantic-ai raises its own error for openai connection errors
+    if e.__cause__ is not None:
+        return is_retryable(e.__cause__)
+    return False
+
+
+@dataclass
+class RetryStats:
+    attempts: Counter = field(default_factory=Counter)
+    retries: Counter = field(default_factory=Counter)
+    failures: Counter = field(default_factory=Counter)
+    waited: Counter = field(default_factory=Counter)
+
+    def on_attempt(self, name: str, attempt: int, error: Optional[BaseException], wait: Optional[float]):
+        self.attempts[name] += 1
+        if error is None:
+            return
+        if wait is None:
+            self.failures[name] += 1
+        else:
+            self.retries[name] += 1
+            self.waited[name] += wait
+
+    def summary(self) -> str:
+        if not self.retries and not self.failures:
+            return "No retries."
+        return "Retries: " + ", ".join(
+            f"{name} {self.retries[name]:,} of {self.attempts[name]:,} attempts, {self.failures[name]:,} failed, "
+            f"waited {self.waited[name]:.1f}s"
+            for name in sorted(self.attempts)
+            if self.retries[name] or self.failures[name]
+        ) + "."
+
+
+retry_stats = RetryStats()
+
+# Called after every attempt with the function name, attempt number, error and the wait before the next attempt,
+# error is None for a successful attempt and wait is None when giving up
+RetryHook = Callable[[str, int, Optional[BaseException], Optional[float]], None]
+
+
+def _print_retry(name: str, attempt: int, error: Optional[BaseException], wait: Optional[float]):
+    if error is not None and wait is not None:
+        print(f"{name} failed ({error}), retrying in {wait:.1f}s")
+
+
 def retry(
-    fn,
-    retries=5,
-    delay=2
+    fn=None,
+    *,
+    retries: int = 5,
+    delay: float = 2,
+    max_delay: float = 60,
+    deadline: Optional[float] = None,
+    retry_on: Callable[[BaseException], bool] = is_retryable,
+    hooks: Iterable[RetryHook] = (retry_stats.on_attempt, _print_retry),
 ):
+    """
+    Retry a function or coroutine function on errors `retry_on` accepts, with exponential backoff and full jitter:
+    each wait is random between 0 and `delay` * 2^attempt capped at `max_delay`, so concurrent workers don't retry
+    in lockstep.
+
+    Gives up and raises the last error after `retries` retries, or when the next attempt would start more than
+    `deadline` seconds after the first one. Can be used as @retry or @retry(...).
+    """
+    if fn is None:
+        return partial(
+            retry,
+            retries=retries,
+            delay=delay,
+            max_delay=max_delay,
+            deadline=deadline,
+            retry_on=retry_on,
+            hooks=hooks,
+        )
+
+    name = fn.__qualname__
+
+    def _next_wait(attempt: int, error: Exception, start: float) -> Optional[float]:
+        if attempt > retries or not retry_on(error):
+            return None
+
+        wait = random.uniform(0, min(max_delay, delay * 2 ** (attempt - 1)))
+        retry_after = getattr(error, "retry_after", None)
+        if retry_after is not None:
+            wait = max(wait, retry_after)
+
+        if deadline is not None and time.monotonic() + wait - start > deadline:
+            return None
+        return wait
+
+    def _report(attempt: int, error: Optional[Exception], wait: Optional[float]):
+        for hook in hooks:
+            hook(name, attempt, error, wait)
+
+    if inspect.iscoroutinefunction(fn):
+        @wraps(fn)
+        async def _async_wrap(*args, **kwargs):
+            start = time.monotonic()
+            attempt = 0
+            while True:
+                attempt += 1
+                try:
+                    result = await fn(*args, **kwargs)
+                except Exception as e:
+                    wait = _next_wait(attempt, e, start)
+                    _report(attempt, e, wait)
+                    if wait is None:
+                        raise
+                    await asyncio.sleep(wait)
+                    continue
+                _report(attempt, None, None)
+                return result
+
+        return _async_wrap
+
     @wraps(fn)
     def _wrap(*args, **kwargs):
-        tries = retries
-        wait = delay
-
-        while tries > 0:
+        start = time.monotonic()
+        attempt = 0
+        while True:
+            attempt += 1
             try:
-                return fn(*args, **kwargs)
+                result = fn(*args, **kwargs)
             except Exception as e:
-                if tries > 0:
-                    tries -= 1
-                    time.sleep(wait)
-                    wait *= 2
-                    print(e)
-                    continue
-                raise
+                wait = _next_wait(attempt, e, start)
+                _report(attempt, e, wait)
+                if wait is None:
+                    raise
+                time.sleep(wait)
+                continue
+            _report(attempt, None, None)
+            return result
 
     return _wrap
 
 
-def list_words(language_id: str):
-    with (LANGUAGES_SRC / f"{language_id}/words.txt").open() as f:
-        for word in f.readlines():
-            yield word.strip()
+def write_atomic(path: Path, data: bytes):
+    """
+    Write the file via a temporary file and rename, so readers never see a partially written file
+    """
+    tmp_path = path.with_name(f".{path.name}.tmp")
+    with tmp_path.open("wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def make_process_pool(workers: int) -> ProcessPoolExecutor:
+    """
+    A pool of worker processes started from a fork server. Forking the worker processes directly could copy a lock
+    another thread holds, e.g. of a connection pool or the SQLite connection, into the child.
+    """
+    return ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("forkserver"))
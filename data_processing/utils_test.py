@@ -0,0 +1,108 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+
+import pytest
+
+from data_processing import utils
+from data_processing.utils import RetryableError, parse_retry_after, retry
+
+
+def test_retry_after_seconds():
+    assert parse_retry_after("120") == 120.0
+    assert parse_retry_after("-5") == 0.0
+
+
+def test_retry_after_http_date():
+    retry_at = datetime.now(timezone.utc) + timedelta(seconds=60)
+    assert 55 < parse_retry_after(format_datetime(retry_at, usegmt=True)) <= 60
+    assert parse_retry_after("Wed, 21 Oct 2015 07:28:00 GMT") == 0.0
+
+
+@pytest.mark.parametrize("value", [None, "", "soon", "nan", "inf", "Wed, 99 Foo 2015"])
+def test_retry_after_unparseable(value):
+    assert parse_retry_after(value) is None
+
+
+@pytest.fixture
+def waits(monkeypatch) -> list[float]:
+    waits = []
+    monkeypatch.setattr(utils.time, "sleep", waits.append)
+    return waits
+
+
+def _failing(errors: list[Exception]):
+    calls = []
+
+    def fn():
+        calls.append(None)
+        if errors:
+            raise errors.pop(0)
+        return len(calls)
+
+    return fn, calls
+
+
+def test_retry_waits_with_capped_jitter(waits: list[float]):
+    fn, _ = _failing([RetryableError("busy") for _ in range(5)])
+    assert retry(fn, retries=5, delay=1, max_delay=4, hooks=())() == 6
+    for attempt, wait in enumerate(waits, 1):
+        assert 0 <= wait <= min(4, 2 ** (attempt - 1))
+
+
+def test_retry_gives_up_after_retries(waits: list[float]):
+    fn, calls = _failing([RetryableError(str(attempt)) for attempt in range(4)])
+    with pytest.raises(RetryableError, match="2"):
+        retry(fn, retries=2, hooks=())()
+    assert len(calls) == 3
+    assert len(waits) == 2
+
+
+def test_retry_does_not_retry_other_errors(waits: list[float]):
+    fn, calls = _failing([ValueError("bad output")])
+    with pytest.raises(ValueError):
+        retry(fn, hooks=())()
+    assert len(calls) == 1
+    assert waits == []
+
+
+def test_retry_waits_at_least_retry_after(waits: list[float]):
+    fn, _ = _failing([RetryableError("throttled", retry_after=3.0)])
+    retry(fn, delay=0.1, hooks=())()
+    assert waits == [3.0]
+
+
+def test_retry_stops_at_deadline(waits: list[float]):
+    fn, calls = _failing([RetryableError("throttled", retry_after=30.0)])
+    with pytest.raises(RetryableError):
+        retry(fn, deadline=10, hooks=())()
+    assert len(calls) == 1
+    assert waits == []
+
+
+def test_retry_reports_attempts(waits: list[float]):
+    reports = []
+    fn, _ = _failing([RetryableError("busy")])
+    retry(fn, hooks=(lambda *args: reports.append(args),))()
+    (name, attempt, error, wait), success = reports
+    assert (attempt, str(error), success[1:]) == (1, "busy", (2, None, None))
+    assert wait == waits[0]
+
+
+def test_retry_coroutine(monkeypatch):
+    waits = []
+
+    async def sleep(seconds: float):
+        waits.append(seconds)
+
+    monkeypatch.setattr(utils.asyncio, "sleep", sleep)
+    errors = [RetryableError("busy", retry_after=1.0)]
+
+    @retry(delay=0.1, hooks=())
+    async def fn():
+        if errors:
+            raise errors.pop()
+        return "done"
+
+    assert asyncio.run(fn()) == "done"
+    assert waits == [1.0]
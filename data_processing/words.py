@@ -0,0 +1,143 @@
+import hashlib
+import heapq
+import tempfile
+import unicodedata
+from itertools import groupby, islice
+from operator import itemgetter
+from pathlib import Path
+from typing import Callable, Iterable, Iterator, Optional
+
+from data_processing.settings import LANGUAGES_SRC, conf
+
+# A word and its line number in the word list, lower is more frequent
+RankedWord = tuple[str, int]
+
+
+def normalize_word(word: str) -> str:
+    return unicodedata.normalize("NFC", word.strip()).lower()
+
+
+class SeenWords:
+    """
+    Set of words kept as 64-bit hashes instead of the strings, a fraction of the memory for long word lists
+    """
+
+    def __init__(self):
+        self.hashes: set[int] = set()
+
+    def add(self, word: str) -> bool:
+        """
+        Add the word, returns False if it was already seen
+        """
+        digest = int.from_bytes(hashlib.blake2b(word.encode("utf-8"), digest_size=8).digest(), "little")
+        if digest in self.hashes:
+            return False
+        self.hashes.add(digest)
+        return True
+
+
+def _write_run(words: list[RankedWord], path: Path) -> Path:
+    with path.open("w", encoding="utf-8") as f:
+        f.writelines(f"{word}\t{rank}\n" for word, rank in words)
+    return path
+
+
+def _read_run(path: Path) -> Iterator[RankedWord]:
+    with path.open(encoding="utf-8") as f:
+        for line in f:
+            word, rank = line.rstrip("\n").split("\t")
+            yield word, int(rank)
+
+
+def _sorted_runs(words: Iterable[RankedWord], directory: Path, name: str, chunk_words: int,
+                 key: Optional[Callable] = None) -> list[Path]:
+    """
+    Sort the words in chunks of `chunk_words`, each written to its own file
+    """
+    runs = []
+    words = iter(words)
+    while chunk := list(islice(words, chunk_words)):
+        chunk.sort(key=key)
+        runs.append(_write_run(chunk, directory / f"{name}-{len(runs)}.tsv"))
+    return runs
+
+
+def _merge_runs(runs: list[Path], key: Optional[Callable] = None) -> Iterator[RankedWord]:
+    return heapq.merge(*(_read_run(path) for path in runs), key=key)
+
+
+def _first_of_each(words: Iterator[RankedWord]) -> Iterator[RankedWord]:
+    # The words are sorted by (word, rank), so the first one has the best rank
+    return (next(group) for _, group in groupby(words, key=itemgetter(0)))
+
+
+class WordSource:
+    """
+    Streams the words of a word list file, most frequent first, one word per line.
+
+    Words are normalized to NFC and lower case, blank lines and duplicates are skipped. Lists longer than
+    `chunk_words` are deduplicated with sorted chunks on disk, so memory use doesn't grow with the list.
+    """
+
+    def __init__(self, path: Path, chunk_words: Optional[int] = None):
+        self.path = path
+        self.chunk_words = chunk_words or conf.WORD_LIST_CHUNK_WORDS
+
+    def lines(self) -> Iterator[str]:
+        """
+        The normalized words including duplicates, in file order
+        """
+        with self.path.open(encoding="utf-8") as f:
+            for line in f:
+                word = normalize_word(line)
+                if word:
+                    yield word
+
+    def count_lines(self) -> int:
+        """
+        Quick upper bound of the number of words
+        """
+        lines = 0
+        last = b""
+        with self.path.open("rb") as f:
+            while chunk := f.read(1 << 20):
+                lines += chunk.count(b"\n")
+                last = chunk
+        if last and not last.endswith(b"\n"):
+            lines += 1
+        return lines
+
+    def __iter__(self) -> Iterator[str]:
+        if self.count_lines() > self.chunk_words:
+            yield from self._unique_on_disk()
+            return
+
+        seen = SeenWords()
+        for word in self.lines():
+            if seen.add(word):
+                yield word
+
+    def _unique_on_disk(self) -> Iterator[str]:
+        with tempfile.TemporaryDirectory(prefix="words-") as directory:
+            directory = Path(directory)
+            ranked = ((word, rank) for rank, word in enumerate(self.lines()))
+            by_word = _sorted_runs(ranked, directory, "word", self.chunk_words)
+            unique = _first_of_each(_merge_runs(by_word))
+            by_rank = _sorted_runs(unique, directory, "rank", self.chunk_words, key=itemgetter(1))
+            for word, _ in _merge_runs(by_rank, key=itemgetter(1)):
+                yield word
+
+    def sorted(self) -> Iterator[str]:
+        """
+        The unique words in alphabetical order
+        """
+        with tempfile.TemporaryDirectory(prefix="words-") as directory:
+            directory = Path(directory)
+            ranked = ((word, rank) for rank, word in enumerate(self.lines()))
+            by_word = _sorted_runs(ranked, directory, "word", self.chunk_words)
+            for word, _ in _first_of_each(_merge_runs(by_word)):
+                yield word
+
+
+def get_word_source(language_id: str) -> WordSource:
+    return WordSource(LANGUAGES_SRC / language_id / "words.txt")